@@ -0,0 +1,124 @@
+import math
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+import pytz
+
+from log_ids import SnowflakeGenerator
+
+ANOMALY_MAX_KEYS = 100000          # tracked (service, node, metric) keys; the least recently seen is evicted beyond this
+LATENCY_ALPHA = 0.05               # EWMA weight of each latency sample
+LATENCY_Z_THRESHOLD = 4.0          # standard deviations above baseline that count as anomalous
+LATENCY_WARMUP = 20                # samples before a latency baseline is trusted
+ERROR_RATE_FAST_ALPHA = 0.1        # short-term error rate (~20 logs)
+ERROR_RATE_SLOW_ALPHA = 0.005      # long-term baseline error rate (~400 logs)
+ERROR_RATE_Z_THRESHOLD = 4.0
+ERROR_RATE_MIN = 0.2               # never alert below this short-term error rate
+ERROR_RATE_WARMUP = 50
+ALERT_COOLDOWN_SECONDS = 60        # per key, so one incident raises one alert
+
+ERROR_LEVELS = {'ERROR', 'FATAL'}
+COUNTED_LEVELS = {'INFO', 'WARN', 'ERROR', 'FATAL'}
+
+# Effective sample count of the fast EWMA, used for the standard error of its rate
+FAST_WINDOW = (2 - ERROR_RATE_FAST_ALPHA) / ERROR_RATE_FAST_ALPHA
+
+
+class AnomalyDetector:
+    """Incremental latency and error-rate anomaly detection with O(1) state per key.
+
+    Latency keeps an EWMA mean and variance per (service, node) and flags
+    samples far above the mean. Error rate keeps a fast and a slow EWMA of the
+    share of ERROR/FATAL logs and flags the fast rate rising well above the
+    slow baseline. State per key is a short list of floats.
+    """
+
+    def __init__(self, emit):
+        self.emit = emit
+        self.latency = OrderedDict()
+        self.error_rate = OrderedDict()
+        self.last_alert = OrderedDict()
+        self.log_ids = SnowflakeGenerator('anomaly_detector')
+
+    def observe(self, log_data):
+        if log_data.get('message_type') != 'LOG':
+            return
+        log_level = log_data.get('log_level')
+        if log_level not in COUNTED_LEVELS:
+            return
+        service = log_data.get('service_name')
+        node = log_data.get('node_id')
+
+        response_time = log_data.get('response_time_ms')
+        if response_time is not None:
+            self._observe_latency((service, node, 'response_time_ms'), float(response_time))
+        self._observe_error((service, node, 'error_rate'), 1.0 if log_level in ERROR_LEVELS else 0.0)
+
+    def _state(self, table, key, initial):
+        state = table.get(key)
+        if state is not None:
+            table.move_to_end(key)
+            return state
+        if len(table) >= ANOMALY_MAX_KEYS:
+            # Keys are moved to the end on every hit, so the first one is the least recently seen
+            table.popitem(last=False)
+        state = table[key] = initial
+        return state
+
+    def _observe_latency(self, key, value):
+        # [mean, variance, samples]
+        state = self._state(self.latency, key, [value, 0.0, 0])
+        mean, variance, samples = state
+        if samples >= LATENCY_WARMUP and variance > 0:
+            z = (value - mean) / math.sqrt(variance)
+            if z > LATENCY_Z_THRESHOLD:
+                self._alert(key, value, mean, z,
+                            f"Latency anomaly: response time {value:.0f} ms vs baseline {mean:.0f} ms")
+        diff = value - mean
+        increment = LATENCY_ALPHA * diff
+        state[0] = mean + increment
+        state[1] = (1 - LATENCY_ALPHA) * (variance + diff * increment)
+        state[2] = samples + 1
+
+    def _observe_error(self, key, is_error):
+        # [fast rate, slow rate, samples]
+        state = self._state(self.error_rate, key, [0.0, 0.0, 0])
+        fast = state[0] + ERROR_RATE_FAST_ALPHA * (is_error - state[0])
+        slow = state[1]
+        state[0] = fast
+        state[1] = slow + ERROR_RATE_SLOW_ALPHA * (is_error - slow)
+        state[2] += 1
+        if state[2] < ERROR_RATE_WARMUP or fast < ERROR_RATE_MIN:
+            return
+        stderr = math.sqrt(max(slow * (1 - slow), 0.01) / FAST_WINDOW)
+        z = (fast - slow) / stderr
+        if z > ERROR_RATE_Z_THRESHOLD:
+            self._alert(key, fast, slow, z,
+                        f"Error rate anomaly: {fast:.0%} of recent logs failed vs baseline {slow:.0%}")
+
+    def _alert(self, key, value, baseline, z, message):
+        now = time.time()
+        if now - self.last_alert.get(key, 0) < ALERT_COOLDOWN_SECONDS:
+            return
+        if key in self.last_alert:
+            self.last_alert.move_to_end(key)
+        elif len(self.last_alert) >= ANOMALY_MAX_KEYS:
+            self.last_alert.popitem(last=False)
+        self.last_alert[key] = now
+        service, node, metric = key
+        self.emit({
+            "log_id": self.log_ids.next_log_id(),
+            "node_id": node,
+            "log_level": "ALERT",
+            "message_type": "LOG",
+            "message": message,
+            "service_name": service,
+            "timestamp": datetime.now(pytz.UTC).isoformat(),
+            "anomaly": {
+                "metric": metric,
+                "value": round(value, 4),
+                "baseline": round(baseline, 4),
+                "zscore": round(z, 2)
+            }
+        })
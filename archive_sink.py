@@ -0,0 +1,272 @@
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import pytz
+
+ARCHIVE_ROWS_PER_GROUP = 10000      # rows buffered per partition before a row group is written
+ARCHIVE_MAX_ROWS_PER_FILE = 1000000  # roll the file once it holds this many rows
+ARCHIVE_MAX_FILE_AGE = 300           # seconds a file may stay open before it is rolled
+ARCHIVE_FLUSH_INTERVAL = 5           # seconds between background flushes
+ARCHIVE_COMPRESSION = 'zstd'
+ARCHIVE_COMPRESSION_LEVEL = 3
+
+DICTIONARY_COLUMNS = ['node_id', 'service_name', 'log_level', 'message_type', 'template_id']
+KNOWN_FIELDS = {
+    'log_id', 'node_id', 'service_name', 'log_level', 'message_type', 'message',
+    'status', 'timestamp', 'response_time_ms', 'threshold_limit_ms', 'error_details',
+    'template_id', 'template_params'
+}
+
+_dict_string = pa.dictionary(pa.int32(), pa.string())
+
+ARCHIVE_SCHEMA = pa.schema([
+    ('timestamp', pa.timestamp('us', tz='UTC')),
+    ('log_id', pa.string()),
+    ('node_id', _dict_string),
+    ('service_name', _dict_string),
+    ('log_level', _dict_string),
+    ('message_type', _dict_string),
+    ('message', pa.string()),
+    ('template_id', _dict_string),
+    ('template_params', pa.list_(pa.string())),
+    ('status', pa.string()),
+    ('response_time_ms', pa.float64()),
+    ('threshold_limit_ms', pa.float64()),
+    ('error_code', pa.string()),
+    ('error_message', pa.string()),
+    ('extra', pa.string()),
+])
+
+PARTITION_SCHEMA = pa.schema([('topic', pa.string()), ('hour', pa.string())])
+
+
+def parse_timestamp(value):
+    """Parse an ISO timestamp into an aware UTC datetime, falling back to now"""
+    try:
+        ts = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return datetime.now(pytz.UTC)
+    if ts.tzinfo is None:
+        return pytz.utc.localize(ts)
+    return ts.astimezone(pytz.UTC)
+
+
+def hour_partition(ts):
+    return ts.strftime('%Y-%m-%dT%H')
+
+
+def _number(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return None
+
+
+def _string(value):
+    return value if isinstance(value, str) else None
+
+
+def _strings(value):
+    if isinstance(value, list) and all(isinstance(item, str) for item in value):
+        return value
+    return None
+
+
+STRING_FIELDS = ['log_id', 'node_id', 'service_name', 'log_level', 'message_type', 'message', 'template_id', 'status']
+NUMBER_FIELDS = ['response_time_ms', 'threshold_limit_ms']
+
+
+def to_row(log_data):
+    """Flatten a log record into the archive column layout.
+
+    A value that does not match its column's type is kept as it came in
+    `extra` instead of failing the whole row group.
+    """
+    extra = {k: v for k, v in log_data.items() if k not in KNOWN_FIELDS}
+    row = {'timestamp': parse_timestamp(log_data.get('timestamp'))}
+    for fields, convert in ((STRING_FIELDS, _string), (NUMBER_FIELDS, _number), (['template_params'], _strings)):
+        for field in fields:
+            value = log_data.get(field)
+            row[field] = convert(value)
+            if value is not None and row[field] is None:
+                extra[field] = value
+    error_details = log_data.get('error_details')
+    details = error_details if isinstance(error_details, dict) else {}
+    row['error_code'] = _string(details.get('error_code'))
+    row['error_message'] = _string(details.get('error_message'))
+    archived = {k: row[k] for k in ('error_code', 'error_message') if row[k] is not None}
+    if error_details not in (None, {}) and error_details != archived:
+        extra['error_details'] = error_details
+    row['extra'] = json.dumps(extra, default=str) if extra else None
+    return row
+
+
+class _PartitionFile:
+    """An open Parquet file that is only visible to readers once rolled"""
+
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        name = f"part-{int(time.time())}-{uuid.uuid4().hex[:8]}.parquet"
+        self.final_path = os.path.join(directory, name)
+        # Dot-prefixed files are skipped by pyarrow.dataset, so scans never see half-written data
+        self.tmp_path = os.path.join(directory, f".{name}.inprogress")
+        self.writer = pq.ParquetWriter(
+            self.tmp_path,
+            ARCHIVE_SCHEMA,
+            compression=ARCHIVE_COMPRESSION,
+            compression_level=ARCHIVE_COMPRESSION_LEVEL,
+            use_dictionary=DICTIONARY_COLUMNS,
+        )
+        self.opened_at = time.time()
+        self.rows = 0
+
+    def write(self, rows):
+        table = pa.Table.from_pylist(rows, schema=ARCHIVE_SCHEMA)
+        self.writer.write_table(table)
+        self.rows += len(rows)
+
+    def roll(self):
+        self.writer.close()
+        os.replace(self.tmp_path, self.final_path)
+        return self.final_path
+
+
+class ArchiveSink:
+    """Columnar archive of consumed logs, partitioned by topic and hour"""
+
+    def __init__(self, base_dir):
+        self.base_dir = base_dir
+        self.buffers = {}
+        self.files = {}
+        self.lock = threading.Lock()
+        self.is_running = False
+
+    def write(self, topic, log_data):
+        row = to_row(log_data)
+        key = (topic, hour_partition(row['timestamp']))
+        with self.lock:
+            rows = self.buffers.setdefault(key, [])
+            rows.append(row)
+            if len(rows) >= ARCHIVE_ROWS_PER_GROUP:
+                try:
+                    self._flush_partition(key)
+                except Exception as e:
+                    # The rows stay buffered for the next flush; this record itself was fine
+                    print(f"Archive flush error: {e}")
+
+    def _flush_partition(self, key):
+        rows = self.buffers.get(key)
+        if not rows:
+            return
+        partition_file = self.files.get(key)
+        if partition_file is None:
+            topic, hour = key
+            directory = os.path.join(self.base_dir, f"topic={topic}", f"hour={hour}")
+            partition_file = self.files[key] = _PartitionFile(directory)
+        partition_file.write(rows)
+        # Dropped only once written, so a failed write loses nothing
+        del self.buffers[key]
+        if partition_file.rows >= ARCHIVE_MAX_ROWS_PER_FILE:
+            self.files.pop(key).roll()
+
+    def flush(self, roll_all=False):
+        """Write buffered rows and roll files that are full, stale or from a closed hour"""
+        with self.lock:
+            for key in list(self.buffers):
+                self._flush_partition(key)
+            now = time.time()
+            current_hour = hour_partition(datetime.now(pytz.UTC))
+            for key in list(self.files):
+                partition_file = self.files[key]
+                if roll_all or key[1] < current_hour or now - partition_file.opened_at > ARCHIVE_MAX_FILE_AGE:
+                    self.files.pop(key).roll()
+
+    def _flush_loop(self):
+        while self.is_running:
+            time.sleep(ARCHIVE_FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Archive flush error: {e}")
+
+    def start(self):
+        self.is_running = True
+        flusher = threading.Thread(target=self._flush_loop)
+        flusher.daemon = True
+        flusher.start()
+
+    def close(self):
+        self.is_running = False
+        self.flush(roll_all=True)
+
+
+def query_archive(base_dir, topic=None, start=None, end=None, filters=None,
+                  columns=None, group_by=None, aggregations=None):
+    """Scan the archive with partition pruning and predicate pushdown.
+
+    `filters` maps column names to a value or a list of values, `start`/`end`
+    are datetimes bounding the record timestamp, and `aggregations` is a list
+    of (column, function) pairs applied per `group_by` key.
+    """
+    dataset = ds.dataset(
+        base_dir,
+        format='parquet',
+        schema=pa.unify_schemas([ARCHIVE_SCHEMA, PARTITION_SCHEMA]),
+        partitioning=ds.partitioning(PARTITION_SCHEMA, flavor='hive'),
+    )
+    expr = None
+
+    def _and(condition):
+        return condition if expr is None else expr & condition
+
+    if topic:
+        expr = _and(ds.field('topic') == topic)
+    if start:
+        start = parse_timestamp(start.isoformat())
+        expr = _and(ds.field('hour') >= hour_partition(start))
+        expr = _and(ds.field('timestamp') >= pa.scalar(start, type=pa.timestamp('us', tz='UTC')))
+    if end:
+        end = parse_timestamp(end.isoformat())
+        expr = _and(ds.field('hour') <= hour_partition(end))
+        expr = _and(ds.field('timestamp') < pa.scalar(end, type=pa.timestamp('us', tz='UTC')))
+    for column, value in (filters or {}).items():
+        if isinstance(value, (list, tuple, set)):
+            expr = _and(ds.field(column).isin(list(value)))
+        else:
+            expr = _and(ds.field(column) == value)
+
+    if group_by or aggregations:
+        needed = set(group_by or []) | {column for column, _ in aggregations or []}
+        table = dataset.to_table(columns=sorted(needed), filter=expr)
+        # Group keys must be plain values, so decode the dictionary columns first
+        for i, field in enumerate(table.schema):
+            if pa.types.is_dictionary(field.type):
+                table = table.set_column(i, field.name, pc.cast(table.column(i), pa.string()))
+        return table.group_by(group_by or []).aggregate(aggregations or [])
+    return dataset.to_table(columns=columns, filter=expr)
+
+
+if __name__ == "__main__":
+    # Usage: python archive_sink.py <archive_dir> <topic> [hours] [log_level]
+    if len(sys.argv) < 3:
+        print("Usage: python archive_sink.py <archive_dir> <topic> [hours] [log_level]")
+        sys.exit(1)
+    hours = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+    level_filter = {'log_level': sys.argv[4]} if len(sys.argv) > 4 else None
+    result = query_archive(
+        sys.argv[1],
+        topic=sys.argv[2],
+        start=datetime.now(pytz.UTC) - timedelta(hours=hours),
+        filters=level_filter,
+        group_by=['service_name', 'log_level'],
+        aggregations=[('timestamp', 'count')],
+    )
+    print(result)
@@ -0,0 +1,219 @@
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from elasticsearch import ApiError, TransportError
+
+from instrumentation import instrumented
+
+BULK_MIN_SIZE = 100
+BULK_MAX_SIZE = 5000
+BULK_SIZE_STEP = 100             # additive increase per healthy request
+BULK_MIN_CONCURRENCY = 1
+BULK_MAX_CONCURRENCY = 8
+BULK_HEALTHY_STREAK = 5          # healthy requests needed before adding a concurrent request
+BULK_TARGET_LATENCY_MS = 500     # latency above this counts as the cluster slowing down
+BULK_MAX_WAIT_SECONDS = 1.0      # flush a partial batch once its oldest record is this old
+BULK_MAX_PENDING = 50000         # pause fetching once this many records wait to be indexed
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 30
+CLOSE_RETRY_SECONDS = 0.1       # shortest pause between flush attempts while closing
+RETRY_STATUSES = {408, 429}      # retried with backoff, as is every 5xx
+
+
+def is_retryable_status(status):
+    return status in RETRY_STATUSES or status >= 500
+
+
+class AdaptiveFlowController:
+    """AIMD control of bulk size and concurrency.
+
+    Healthy, fast requests grow the bulk size by a fixed step (and concurrency
+    by one after a streak); a 429 or a slow request halves both and starts a
+    jittered exponential backoff during which no requests are sent.
+    """
+
+    def __init__(self):
+        self.batch_size = BULK_MIN_SIZE
+        self.concurrency = BULK_MIN_CONCURRENCY
+        self.healthy_streak = 0
+        self.backoff_attempt = 0
+        self.backoff_until = 0
+        self.lock = threading.Lock()
+
+    def on_success(self, latency_ms):
+        with self.lock:
+            if latency_ms > BULK_TARGET_LATENCY_MS:
+                self._decrease(backoff=False)
+                return
+            self.backoff_attempt = 0
+            self.batch_size = min(BULK_MAX_SIZE, self.batch_size + BULK_SIZE_STEP)
+            self.healthy_streak += 1
+            if self.healthy_streak >= BULK_HEALTHY_STREAK:
+                self.healthy_streak = 0
+                self.concurrency = min(BULK_MAX_CONCURRENCY, self.concurrency + 1)
+
+    def on_rejected(self):
+        with self.lock:
+            self._decrease(backoff=True)
+
+    def _decrease(self, backoff):
+        self.healthy_streak = 0
+        self.batch_size = max(BULK_MIN_SIZE, self.batch_size // 2)
+        self.concurrency = max(BULK_MIN_CONCURRENCY, self.concurrency // 2)
+        if backoff:
+            delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** self.backoff_attempt))
+            delay *= random.uniform(0.5, 1.5)
+            self.backoff_attempt += 1
+            self.backoff_until = max(self.backoff_until, time.time() + delay)
+
+    def is_backing_off(self):
+        return time.time() < self.backoff_until
+
+    def backoff_remaining(self):
+        return max(0, self.backoff_until - time.time())
+
+
+class BulkIndexer:
+    """Buffers create actions and sends them as adaptively sized bulk requests.
+
+    Items Elasticsearch rejects with 429 or a 5xx (or whole requests that fail
+    that way or with a connection error) are retried after a backoff; 409
+    conflicts are counted as duplicates. Any other error means the action will
+    never be accepted as sent, so it goes to the dead-letter sink (or is
+    reported and dropped without one). While the connection is down, actions
+    stay pending until it comes back.
+    """
+
+    def __init__(self, connection, controller=None, dead_letters=None):
+        self.connection = connection
+        self.controller = controller or AdaptiveFlowController()
+        self.dead_letters = dead_letters
+        self.pending = []
+        self.oldest_pending = None
+        self.executor = ThreadPoolExecutor(max_workers=BULK_MAX_CONCURRENCY)
+        self.stats = {'indexed': 0, 'duplicates': 0, 'retried': 0, 'failed': 0, 'dead_lettered': 0, 'requests': 0}
+        self.stats_lock = threading.Lock()
+
+    def add(self, index_name, doc_id, document, op='create', version=None):
+        """Queue a bulk action; `op='index'` with an external `version` upserts without going back in time"""
+        if not self.pending:
+            self.oldest_pending = time.time()
+        self.pending.append((index_name, doc_id, document, op, version))
+        if len(self.pending) >= self.controller.batch_size * self.controller.concurrency:
+            self.flush()
+
+    def should_pause(self):
+        """True while fetching more records would only grow the backlog"""
+        if len(self.pending) >= BULK_MAX_PENDING:
+            return True
+        return bool(self.pending) and self.controller.is_backing_off()
+
+    def flush_if_due(self):
+        if self.pending and time.time() - self.oldest_pending >= BULK_MAX_WAIT_SECONDS:
+            self.flush()
+
+    def flush(self):
+        """Send pending actions; rejected ones stay pending for the next flush"""
+        if not self.pending or self.controller.is_backing_off():
+            return
+        # Until Elasticsearch is reachable again everything simply stays pending
+        es = self.connection.get()
+        if es is None:
+            return
+        batch_size = self.controller.batch_size
+        concurrency = self.controller.concurrency
+        to_send = self.pending[:batch_size * concurrency]
+        remaining = self.pending[batch_size * concurrency:]
+        chunks = [to_send[i:i + batch_size] for i in range(0, len(to_send), batch_size)]
+
+        retry = []
+        for rejected in self.executor.map(lambda chunk: self._send(es, chunk), chunks):
+            retry.extend(rejected)
+        self.pending = retry + remaining
+        self.oldest_pending = time.time() if self.pending else None
+
+    @instrumented('es_bulk')
+    def _send(self, es, chunk):
+        operations = []
+        for index_name, doc_id, document, op, version in chunk:
+            meta = {'_index': index_name, '_id': doc_id}
+            if version is not None:
+                meta['version'] = version
+                meta['version_type'] = 'external'
+            operations.append({op: meta})
+            operations.append(document)
+
+        started = time.perf_counter()
+        try:
+            response = es.bulk(operations=operations)
+        except ApiError as e:
+            if is_retryable_status(e.status_code):
+                self.controller.on_rejected()
+                self._count('retried', len(chunk))
+                return chunk
+            print(f"Bulk request failed: {e}")
+            for action in chunk:
+                self._reject(action, f"bulk_{e.status_code}", str(e))
+            return []
+        except TransportError as e:
+            self.connection.mark_failed(e)
+            self._count('retried', len(chunk))
+            return chunk
+        latency_ms = (time.perf_counter() - started) * 1000
+        self._count('requests', 1)
+
+        if not response.get('errors'):
+            self._count('indexed', len(chunk))
+            self.controller.on_success(latency_ms)
+            return []
+
+        rejected = []
+        for action, item in zip(chunk, response['items']):
+            result = item.get(action[3], {})
+            status = result.get('status', 0)
+            if is_retryable_status(status):
+                rejected.append(action)
+            elif status == 409:
+                self._count('duplicates', 1)
+            elif status >= 300:
+                self._reject(action, f"index_{status}", json.dumps(result.get('error'), default=str))
+            else:
+                self._count('indexed', 1)
+        if rejected:
+            self.controller.on_rejected()
+            self._count('retried', len(rejected))
+        else:
+            self.controller.on_success(latency_ms)
+        return rejected
+
+    def _reject(self, action, code, reason):
+        """An action the index will never accept as sent: dead-letter it when a sink is set"""
+        index_name, doc_id, document = action[:3]
+        if self.dead_letters is None:
+            print(f"Failed to index log {doc_id}: {reason}")
+            self._count('failed', 1)
+            return
+        self.dead_letters.reject_document(index_name, doc_id, document, code, reason)
+        self._count('dead_lettered', 1)
+
+    def _count(self, key, amount):
+        with self.stats_lock:
+            self.stats[key] += amount
+
+    def close(self, timeout=30):
+        """Flush everything still pending, waiting out any backoff up to `timeout` seconds"""
+        deadline = time.time() + timeout
+        while self.pending and time.time() < deadline:
+            time.sleep(min(self.controller.backoff_remaining(), max(0, deadline - time.time())))
+            # Wait for Elasticsearch to come back rather than polling it
+            if self.connection.wait_ready(max(0, deadline - time.time())) is None:
+                break
+            self.flush()
+            if self.pending:
+                time.sleep(CLOSE_RETRY_SECONDS)
+        if self.pending:
+            print(f"Dropping {len(self.pending)} logs that could not be indexed before shutdown")
+        self.executor.shutdown(wait=True)
@@ -1,10 +1,26 @@
 import json
-from kafka import KafkaConsumer
-from elasticsearch import Elasticsearch
+import os
+import time
+from kafka import KafkaConsumer, KafkaProducer, TopicPartition
 import sys
 from datetime import datetime
 import pytz
 from colorama import init, Fore, Style
+from archive_sink import ArchiveSink
+from local_index import LocalLogIndex
+from template_miner import TemplateMiner
+from dedup import RecentIdFilter, get_document_id
+from bulk_indexer import BulkIndexer
+from lanes import ConsumerLane, print_lane_stats
+from lag_monitor import KafkaOffsetSource, LagMonitor, print_lag_report
+from es_pool import create_elasticsearch_client, print_node_stats
+from tail_server import TailServer
+from anomaly_detector import AnomalyDetector
+from node_state import NodeStateTable, NODE_STATE_INDEX, NODE_STATE_REFRESH_SECONDS, timestamp_version
+from instrumentation import instrumented, install_signal_handlers, count
+from reconnect import LazyConnection
+from validation import InvalidRecord, parse_record
+from dead_letter import DeadLetterSink
 
 
 init()
@@ -28,10 +44,98 @@ EMOJI_REGISTRATION = f"{LogColors.REGISTRATION}[REGISTRATION]{LogColors.RESET} "
 EMOJI_ALERT = f"{LogColors.ALERT}[ALERT]{LogColors.RESET} "
 
 KAFKA_BROKER = 'localhost:9092'
-TOPICS = ['service_logs', 'alert_logs', 'health_logs']
-ELASTICSEARCH_HOST = 'http://localhost:9200'
+ALERT_TOPIC = 'alert_logs'
+ALERT_LANE_TOPICS = ['alert_logs']  # consumed by their own low-latency lane, always served first
+BULK_LANE_TOPICS = ['service_logs', 'health_logs']
+ELASTICSEARCH_HOSTS = ['http://localhost:9200']
+ES_NODE_SELECTOR = 'round_robin'  # 'round_robin' or 'least_loaded'
+ES_SNIFF = False  # Discover the other cluster nodes from the seed hosts
+ES_HTTP_COMPRESS = True  # gzip request bodies
+POLL_TIMEOUT_MS = 50  # short, so the alert lane is checked often even when the bulk lane is idle
+MAX_POLL_RECORDS = 2000  # records handed to one batch
+FETCH_MIN_BYTES = 64 * 1024  # let the broker accumulate this much before answering a fetch...
+FETCH_MAX_WAIT_MS = 100  # ...or until this much time has passed
+ALERT_MAX_POLL_RECORDS = 100  # the alert lane fetches small batches and answers immediately
+ALERT_FETCH_MIN_BYTES = 1
+ALERT_FETCH_MAX_WAIT_MS = 10
+LANE_YIELD_RECORDS = 200  # bulk lane records processed between checks of the alert lane
+LANE_STATS_INTERVAL = 60  # seconds between lane latency and consumer lag reports
+LAG_MONITOR_ENABLED = True  # Track this group's lag per partition and report it with the lane stats
+LOOP_ERROR_BACKOFF_MAX = 30  # seconds, cap for waits after unexpected errors in the consume loop
+INDEX_BACKEND = 'elasticsearch'  # 'elasticsearch' or 'local' for the embedded index
+LOCAL_INDEX_DIR = 'local_index'
+TEMPLATE_MINING_ENABLED = True  # Tag LOG messages with template_id and template_params
+TEMPLATE_STATE_FILE = 'templates.json'
+ARCHIVE_ENABLED = False  # Also write consumed logs to hourly Parquet files
+ARCHIVE_DIR = 'archive'
+ANOMALY_DETECTION_ENABLED = True  # Publish ALERT logs for latency and error-rate anomalies
+NODE_STATE_ENABLED = True  # Keep the latest status per node and index heartbeats sampled
+NODE_STATE_FILE = 'node_state.json'  # Where the table is saved with the local backend
+DEAD_LETTER_TO = 'kafka'  # 'kafka' for the dead_letter_logs topic or 'file' for dead_letter.ndjson
+TAIL_SERVER_ENABLED = False  # Stream logs to viewers at http://<host>:<port>/tail
+TAIL_SERVER_HOST = '0.0.0.0'
+TAIL_SERVER_PORT = 8088
 
-es = Elasticsearch([ELASTICSEARCH_HOST])
+# Clients connect on first use and reconnect in the background, so startup never waits on them
+es_connection = LazyConnection(
+    'Elasticsearch',
+    lambda: create_elasticsearch_client(
+        ELASTICSEARCH_HOSTS,
+        selector=ES_NODE_SELECTOR,
+        sniff=ES_SNIFF,
+        compress=ES_HTTP_COMPRESS
+    ),
+    lambda client: client.ping()
+)
+def create_kafka_consumer(topics, max_poll_records, fetch_min_bytes, fetch_max_wait_ms):
+    return KafkaConsumer(
+        *topics,
+        bootstrap_servers=KAFKA_BROKER,
+        # Values stay raw bytes and are decoded per record, so one bad message cannot break a poll
+        auto_offset_reset='earliest',
+        group_id="log_consumer_group",
+        max_poll_records=max_poll_records,
+        fetch_min_bytes=fetch_min_bytes,
+        fetch_max_wait_ms=fetch_max_wait_ms,
+        # Offsets are committed once a whole batch has been handed to the index
+        enable_auto_commit=False
+    )
+
+producer_connection = LazyConnection(
+    'Kafka producer',
+    lambda: KafkaProducer(
+        bootstrap_servers=KAFKA_BROKER,
+        value_serializer=lambda v: json.dumps(v).encode('utf-8')
+    )
+)
+dead_letters = DeadLetterSink(producer_connection if DEAD_LETTER_TO == 'kafka' else None)
+alert_lane = ConsumerLane(
+    'alerts',
+    ALERT_LANE_TOPICS,
+    LazyConnection('Kafka alert lane', lambda: create_kafka_consumer(
+        ALERT_LANE_TOPICS, ALERT_MAX_POLL_RECORDS, ALERT_FETCH_MIN_BYTES, ALERT_FETCH_MAX_WAIT_MS)),
+    BulkIndexer(es_connection, dead_letters=dead_letters),
+    priority=True
+)
+bulk_lane = ConsumerLane(
+    'bulk',
+    BULK_LANE_TOPICS,
+    LazyConnection('Kafka bulk lane', lambda: create_kafka_consumer(
+        BULK_LANE_TOPICS, MAX_POLL_RECORDS, FETCH_MIN_BYTES, FETCH_MAX_WAIT_MS)),
+    BulkIndexer(es_connection, dead_letters=dead_letters)
+)
+lanes = [alert_lane, bulk_lane]
+archive_sink = ArchiveSink(ARCHIVE_DIR) if ARCHIVE_ENABLED else None
+tail_server = None
+local_indexes = {}
+template_miner = TemplateMiner() if TEMPLATE_MINING_ENABLED else None
+recent_ids = RecentIdFilter()
+anomaly_detector = None
+lag_monitor = None
+node_state = NodeStateTable() if NODE_STATE_ENABLED else None
+node_state_saved_at = 0
+duplicate_count = 0
+sampled_heartbeats = 0
 
 IST = pytz.timezone('Asia/Kolkata')
 
@@ -47,7 +151,7 @@ def convert_utc_to_ist(utc_timestamp):
         return ist_time.isoformat()
     return utc_timestamp 
 
-def display_log(log_data):
+def format_log(log_data):
     emoji = ""
     log_level = log_data.get("log_level", "UNKNOWN")
     message_type = log_data.get("message_type", "UNKNOWN")
@@ -71,7 +175,24 @@ def display_log(log_data):
     timestamp = log_data.get('timestamp', datetime.utcnow().isoformat())
     timestamp_ist = convert_utc_to_ist(datetime.fromisoformat(timestamp))
 
-    print(f"{emoji}{timestamp_ist} - {log_data.get('node_id')} - {log_data.get('message')}")
+    return f"{emoji}{timestamp_ist} - {log_data.get('node_id')} - {log_data.get('message')}"
+
+@instrumented('display_logs')
+def display_logs(batch):
+    """Print a batch of logs in timestamp order with a single write"""
+    if batch:
+        batch.sort(key=lambda log_data: log_data.get('timestamp', ''))
+        print('\n'.join(format_log(log_data) for log_data in batch))
+
+def add_template(log_data):
+    """Attach the mined message template id and its parameters to a LOG record"""
+    message = log_data.get('message')
+    if log_data.get('message_type') != 'LOG' or not isinstance(message, str):
+        return
+    template_id, _, params = template_miner.add(message)
+    if template_id:
+        log_data['template_id'] = template_id
+        log_data['template_params'] = params
 
 def get_elasticsearch_index(log_data):
     """Get Elasticsearch index based on log type"""
@@ -83,51 +204,280 @@ def get_elasticsearch_index(log_data):
     else:
         return 'service_logs'
 
-def store_in_elasticsearch(log_data):
+@instrumented('store_in_elasticsearch')
+def store_in_elasticsearch(log_data, doc_id, indexer):
     try:
         if 'timestamp' not in log_data:
             log_data['timestamp'] = datetime.utcnow().isoformat()
 
         index_name = get_elasticsearch_index(log_data)
-        response = es.index(index=index_name, document=log_data)
-        if response.get('result') != 'created':
-            print(f"{EMOJI_ERROR}Failed to index log: {response}")
+        # Sent as a bulk create, which conflicts instead of overwriting, so redelivered logs are stored once
+        indexer.add(index_name, doc_id, log_data)
     except Exception as e:
         print(f"{EMOJI_ERROR}Elasticsearch error: {e}")
 
+def get_local_index(index_name):
+    """Get the embedded index for an Elasticsearch index name, opening it on first use"""
+    if index_name not in local_indexes:
+        local_index = LocalLogIndex(os.path.join(LOCAL_INDEX_DIR, index_name))
+        local_index.start()
+        local_indexes[index_name] = local_index
+    return local_indexes[index_name]
+
+@instrumented('store_in_local_index')
+def store_in_local_index(log_data, doc_id, indexer=None):
+    try:
+        if 'timestamp' not in log_data:
+            log_data['timestamp'] = datetime.utcnow().isoformat()
+
+        index_name = get_elasticsearch_index(log_data)
+        get_local_index(index_name).add(log_data)
+    except Exception as e:
+        print(f"{EMOJI_ERROR}Local index error: {e}")
+
+store_log = store_in_local_index if INDEX_BACKEND == 'local' else store_in_elasticsearch
+
+def store_node_state(state, indexer):
+    """Upsert a node's current state, keyed by node_id"""
+    if INDEX_BACKEND != 'local':
+        indexer.add(NODE_STATE_INDEX, state['node_id'], state, op='index',
+                         version=timestamp_version(state['last_seen']))
+
+def save_node_state_if_due():
+    # The local backend has no upserts, so the table is written out as a file instead
+    global node_state_saved_at
+    if INDEX_BACKEND != 'local' or not node_state.dirty:
+        return
+    if time.time() - node_state_saved_at >= NODE_STATE_REFRESH_SECONDS:
+        node_state.save(NODE_STATE_FILE)
+        node_state_saved_at = time.time()
+
+def process_message(message, lane):
+    """Validate, enrich and store one record, returning it for display (None if skipped)"""
+    global duplicate_count, sampled_heartbeats
+    count('logs_consumed')
+    try:
+        log_data = parse_record(message.value)
+    except InvalidRecord as e:
+        reject_message(message, e.code, str(e))
+        return None
+    # Derive the id before the record is enriched so redeliveries hash the same
+    doc_id = get_document_id(log_data)
+    if recent_ids.seen(doc_id):
+        duplicate_count += 1
+        count('duplicates_skipped')
+        return None
+    if template_miner:
+        add_template(log_data)
+    keep_raw = True
+    if node_state:
+        state, keep_raw = node_state.observe(log_data)
+        if state:
+            store_node_state(state, lane.indexer)
+    if keep_raw:
+        store_log(log_data, doc_id, lane.indexer)
+    else:
+        sampled_heartbeats += 1
+        count('heartbeats_sampled_out')
+    if archive_sink:
+        archive_sink.write(message.topic, log_data)
+    if tail_server:
+        tail_server.publish(log_data)
+    if anomaly_detector:
+        anomaly_detector.observe(log_data)
+    return log_data
+
+@instrumented('process_batch')
+def process_batch(messages, lane):
+    """Process one poll as a unit: every record, then one display write and one bulk flush"""
+    count('batches')
+    batch = []
+    processed = 0
+    try:
+        for start in range(0, len(messages), LANE_YIELD_RECORDS):
+            for message in messages[start:start + LANE_YIELD_RECORDS]:
+                try:
+                    log_data = process_message(message, lane)
+                except Exception as e:
+                    # A record that passed validation but still fails is set aside, not retried forever
+                    reject_message(message, 'processing_error', f"{type(e).__name__}: {e}")
+                    log_data = None
+                processed += 1
+                if log_data is not None:
+                    batch.append(log_data)
+            if not lane.priority:
+                # Alerts that arrived meanwhile go ahead of the rest of a large batch
+                try:
+                    serve_lane(alert_lane, timeout_ms=0)
+                except Exception as e:
+                    # The alert lane rewinds its own batch; this one carries on
+                    print(f"{EMOJI_ERROR}Error while serving the alert lane: {e}")
+        display_logs(batch)
+    except Exception:
+        # The consumer's position is already past the whole poll, so go back for what was not handled
+        rewind(lane, messages[processed:])
+        raise
+    lane.indexer.flush()
+    lane.record_batch(messages)
+
+def serve_lane(lane, timeout_ms):
+    """Poll one lane once and process what it returns"""
+    consumer = lane.connection.client
+    # Stop fetching while Elasticsearch is pushing back or unreachable; buffered logs keep flushing
+    if lane.indexer.should_pause():
+        consumer.pause(*consumer.assignment())
+    elif consumer.paused():
+        consumer.resume(*consumer.paused())
+
+    records = poll_records(consumer, timeout_ms)
+    if records:
+        process_batch([message for messages in records.values() for message in messages], lane)
+        # Commit only when nothing is still waiting to be indexed, so a crash replays instead of losing logs
+        if not lane.indexer.pending:
+            consumer.commit_async()
+    lane.indexer.flush_if_due()
+
+def rewind(lane, messages):
+    """Seek each partition back to the first of `messages`, so the next poll returns them again"""
+    consumer = lane.connection.client
+    first_offsets = {}
+    for message in messages:
+        first_offsets.setdefault(TopicPartition(message.topic, message.partition), message.offset)
+    for tp, offset in first_offsets.items():
+        try:
+            consumer.seek(tp, offset)
+        except Exception as e:
+            # Not assigned any more: its new owner starts from the last commit, which is before this
+            print(f"{EMOJI_ERROR}Could not rewind {tp.topic}/{tp.partition} to {offset}: {e}")
+
+def reject_message(message, code, reason):
+    count('records_rejected')
+    print(f"{EMOJI_ERROR}Rejected record {message.topic}/{message.partition}@{message.offset}: {reason}")
+    try:
+        dead_letters.reject(message, code, reason)
+    except Exception as e:
+        print(f"{EMOJI_ERROR}Could not dead-letter record {message.topic}/{message.partition}@{message.offset}: {e}")
+
+@instrumented('kafka_poll')
+def poll_records(consumer, timeout_ms=POLL_TIMEOUT_MS):
+    return consumer.poll(timeout_ms=timeout_ms)
+
+def readiness():
+    """Connection state of every client the consumer depends on"""
+    connections = [lane.connection for lane in lanes]
+    if INDEX_BACKEND != 'local':
+        connections.append(es_connection)
+    if ANOMALY_DETECTION_ENABLED or DEAD_LETTER_TO == 'kafka':
+        connections.append(producer_connection)
+    return {connection.name: connection.status() for connection in connections}
+
+def publish_alert(alert):
+    # Alerts go back through Kafka so they are indexed and displayed like any other ALERT
+    alert_producer = producer_connection.get()
+    if alert_producer is None:
+        print(f"{EMOJI_ERROR}Dropping anomaly alert, Kafka producer not ready: {alert['message']}")
+        return
+    alert_producer.send(ALERT_TOPIC, alert)
+
+def start_lag_monitor():
+    global lag_monitor
+    try:
+        lag_monitor = LagMonitor(KafkaOffsetSource(KAFKA_BROKER), topics=ALERT_LANE_TOPICS + BULK_LANE_TOPICS)
+        lag_monitor.start()
+    except Exception as e:
+        print(f"{EMOJI_ERROR}Lag monitor not started: {e}")
+
+def print_consumer_stats():
+    print_lane_stats(lanes)
+    if lag_monitor and lag_monitor.partitions:
+        print_lag_report(lag_monitor.report())
+
 def consume_logs():
-    logs = []
+    global anomaly_detector
+    consecutive_errors = 0
+    stats_reported_at = time.time()
     try:
-        consumer = KafkaConsumer(
-            *TOPICS,
-            bootstrap_servers=KAFKA_BROKER,
-            value_deserializer=lambda m: json.loads(m.decode('utf-8')),
-            auto_offset_reset='earliest',
-            group_id="log_consumer_group"
-        )
-        print(f"Connected to Kafka broker at {KAFKA_BROKER}. Listening to topics: {', '.join(TOPICS)}")
-        for message in consumer:
-            log_data = message.value
-            logs.append(log_data)
-            store_in_elasticsearch(log_data)
-
-            logs_sorted = sorted(logs, key=lambda x: x.get('timestamp', ''), reverse=False)
-         
-            for log in logs_sorted:
-                display_log(log)
-            
+        for lane in lanes:
+            lane.connection.wait_ready()
+            print(f"Connected to Kafka broker at {KAFKA_BROKER}. Lane {lane.name} listening to topics: {', '.join(lane.topics)}")
+        if ANOMALY_DETECTION_ENABLED or DEAD_LETTER_TO == 'kafka':
+            producer_connection.get()
+        if ANOMALY_DETECTION_ENABLED:
+            anomaly_detector = AnomalyDetector(publish_alert)
+        if LAG_MONITOR_ENABLED:
+            start_lag_monitor()
+        while True:
+            try:
+                # Alerts first, without waiting; then one bulk poll, which also yields to alerts as it goes
+                serve_lane(alert_lane, timeout_ms=0)
+                serve_lane(bulk_lane, timeout_ms=POLL_TIMEOUT_MS)
+                if node_state:
+                    save_node_state_if_due()
+                if time.time() - stats_reported_at >= LANE_STATS_INTERVAL:
+                    print_consumer_stats()
+                    stats_reported_at = time.time()
+                consecutive_errors = 0
+            except Exception as e:
+                # Transient failures should not take the consumer down; back off and carry on
+                consecutive_errors += 1
+                delay = min(LOOP_ERROR_BACKOFF_MAX, 0.5 * (2 ** (consecutive_errors - 1)))
+                print(f"{EMOJI_ERROR}Error while consuming logs: {e}. Retrying in {delay:.1f}s")
+                time.sleep(delay)
+
     except KeyboardInterrupt:
-        print("\nConsumer stopped.")
+        duplicates = duplicate_count + sum(lane.indexer.stats['duplicates'] for lane in lanes)
+        print(f"\nConsumer stopped. Skipped {duplicates} duplicate logs.")
+        if node_state:
+            print(f"Tracked {len(node_state.nodes)} nodes, left {sampled_heartbeats} heartbeats unindexed.")
+        if dead_letters.total():
+            reasons = ', '.join(f"{code}: {n}" for code, n in dead_letters.counts.most_common())
+            print(f"Rejected {dead_letters.total()} records ({reasons}).")
+        print_consumer_stats()
+        print_node_stats()
         sys.exit(0)
-    except Exception as e:
-        print(f"{EMOJI_ERROR}Error while consuming logs: {e}")
-        sys.exit(1)
+    finally:
+        if lag_monitor:
+            lag_monitor.stop()
+        producer_connection.close()
+        dead_letters.close()
+        if tail_server:
+            tail_server.stop()
+        for lane in lanes:
+            lane.indexer.close()
+            if lane.connection.is_ready and not lane.indexer.pending:
+                try:
+                    lane.connection.client.commit()
+                except Exception as e:
+                    print(f"{EMOJI_ERROR}Could not commit {lane.name} lane offsets on shutdown: {e}")
+            lane.connection.close()
+        es_connection.close()
+        if archive_sink:
+            archive_sink.close()
+        for local_index in local_indexes.values():
+            local_index.close()
+        if template_miner:
+            template_miner.save(TEMPLATE_STATE_FILE)
+        if node_state and INDEX_BACKEND == 'local':
+            node_state.save(NODE_STATE_FILE)
 
 if __name__ == "__main__":
-    if not es.ping():
-        print(f"{EMOJI_ERROR}Unable to connect to Elasticsearch at {ELASTICSEARCH_HOST}")
-        sys.exit(1)
-
-    print(f"Connected to Elasticsearch at {ELASTICSEARCH_HOST}")
+    install_signal_handlers('consumer')
+    if INDEX_BACKEND == 'local':
+        print(f"Indexing logs locally in {LOCAL_INDEX_DIR}")
+    else:
+        # Logs are buffered until Elasticsearch answers; no need to wait for it here
+        es_connection.get()
+        print(f"Indexing logs in Elasticsearch at {', '.join(ELASTICSEARCH_HOSTS)}")
+    if template_miner:
+        template_miner.load(TEMPLATE_STATE_FILE)
+    if node_state and INDEX_BACKEND == 'local':
+        node_state.load(NODE_STATE_FILE)
+    if archive_sink:
+        archive_sink.start()
+        print(f"Archiving logs to {ARCHIVE_DIR}")
+    if TAIL_SERVER_ENABLED:
+        tail_server = TailServer(TAIL_SERVER_HOST, TAIL_SERVER_PORT, readiness=readiness)
+        tail_server.start()
+        print(f"Live tail available at http://{TAIL_SERVER_HOST}:{TAIL_SERVER_PORT}/tail")
     consume_logs()
 
@@ -0,0 +1,76 @@
+import json
+import threading
+from collections import Counter
+from datetime import datetime
+
+import pytz
+
+DEAD_LETTER_TOPIC = 'dead_letter_logs'
+DEAD_LETTER_FILE = 'dead_letter.ndjson'
+
+
+class DeadLetterSink:
+    """Keeps records the consumer could not process, with the reason, so ingest can move on.
+
+    Records go to a Kafka topic when a producer is available and to an NDJSON
+    file otherwise (or always, when no producer connection is given).
+    Rejections are counted per reason code.
+    """
+
+    def __init__(self, producer_connection=None, topic=DEAD_LETTER_TOPIC, path=DEAD_LETTER_FILE):
+        self.producer_connection = producer_connection
+        self.topic = topic
+        self.path = path
+        self.counts = Counter()
+        self.file = None
+        self.lock = threading.Lock()
+
+    def reject(self, message, code, reason):
+        self.counts[code] += 1
+        raw = message.value
+        if isinstance(raw, bytes):
+            raw = raw.decode('utf-8', errors='replace')
+        elif not isinstance(raw, str):
+            raw = json.dumps(raw, default=str)
+        record = {
+            'topic': message.topic,
+            'partition': message.partition,
+            'offset': message.offset,
+            'error_code': code,
+            'error_message': reason,
+            'value': raw,
+            'rejected_at': datetime.now(pytz.UTC).isoformat(),
+        }
+        self._store(record)
+
+    def reject_document(self, index_name, doc_id, document, code, reason):
+        """Keep a document the index refused, e.g. a mapping conflict"""
+        self.counts[code] += 1
+        self._store({
+            'index': index_name,
+            'doc_id': doc_id,
+            'error_code': code,
+            'error_message': reason,
+            'value': json.dumps(document, default=str),
+            'rejected_at': datetime.now(pytz.UTC).isoformat(),
+        })
+
+    def _store(self, record):
+        producer = self.producer_connection.get() if self.producer_connection else None
+        if producer is not None:
+            producer.send(self.topic, record)
+            return
+        with self.lock:
+            if self.file is None:
+                self.file = open(self.path, 'a', encoding='utf-8')
+            self.file.write(json.dumps(record) + '\n')
+            self.file.flush()
+
+    def total(self):
+        return sum(self.counts.values())
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
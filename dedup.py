@@ -0,0 +1,44 @@
+import hashlib
+import json
+
+DEDUP_CAPACITY = 100000  # ids per generation; at most twice this many are remembered
+
+
+def get_document_id(log_data):
+    """Deterministic Elasticsearch _id for a log record.
+
+    LOG records carry a log_id, which is prefixed with the node_id so that two
+    nodes that claimed the same generator slot cannot overwrite each other.
+    HEARTBEAT and REGISTRATION records do not, so their id is a hash of the
+    record content, which is identical on redelivery.
+    """
+    log_id = log_data.get('log_id')
+    if log_id:
+        node_id = log_data.get('node_id')
+        return f"{node_id}:{log_id}" if node_id else str(log_id)
+    encoded = json.dumps(log_data, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.blake2b(encoded.encode('utf-8'), digest_size=16).hexdigest()
+
+
+class RecentIdFilter:
+    """Exact, memory-bounded set of recently seen ids.
+
+    Ids go into the current generation; once it is full it becomes the
+    previous generation and the one before that is dropped, so lookups cover
+    the last `capacity` to `2 * capacity` ids without per-hit bookkeeping.
+    """
+
+    def __init__(self, capacity=DEDUP_CAPACITY):
+        self.capacity = capacity
+        self.current = set()
+        self.previous = set()
+
+    def seen(self, doc_id):
+        """Return True if the id was seen recently, otherwise remember it"""
+        if doc_id in self.current or doc_id in self.previous:
+            return True
+        if len(self.current) >= self.capacity:
+            self.previous = self.current
+            self.current = set()
+        self.current.add(doc_id)
+        return False
@@ -0,0 +1,130 @@
+import random
+import threading
+import time
+
+from elasticsearch import Elasticsearch
+from elastic_transport import NodeSelector, Urllib3HttpNode
+
+ES_CONNECTIONS_PER_NODE = 10     # persistent HTTP connections kept open per node
+ES_SNIFF_INTERVAL = 60           # minimum seconds between sniffs
+LATENCY_EWMA_ALPHA = 0.2
+LATENCY_HALF_LIFE_SECONDS = 10   # an unused node's latency decays toward the pool mean at this rate
+UNHEALTHY_RETRY_SECONDS = 5      # an unhealthy node is tried again after this long
+
+node_stats = {}
+node_stats_lock = threading.Lock()
+
+
+def _stats_for(base_url):
+    stats = node_stats.get(base_url)
+    if stats is None:
+        with node_stats_lock:
+            stats = node_stats.setdefault(base_url, {
+                'requests': 0,
+                'errors': 0,
+                'in_flight': 0,
+                'latency_ms': 0.0,
+                'last_status': None,
+                'healthy': True,
+                'updated_at': time.time(),
+            })
+    return stats
+
+
+class StatsHttpNode(Urllib3HttpNode):
+    """urllib3 node that records per-node load, latency and health"""
+
+    def perform_request(self, method, target, body=None, headers=None, **kwargs):
+        stats = _stats_for(self.base_url)
+        with node_stats_lock:
+            stats['in_flight'] += 1
+        started = time.perf_counter()
+        try:
+            response = super().perform_request(method, target, body=body, headers=headers, **kwargs)
+        except Exception:
+            with node_stats_lock:
+                stats['errors'] += 1
+                stats['healthy'] = False
+                stats['updated_at'] = time.time()
+            raise
+        finally:
+            with node_stats_lock:
+                stats['in_flight'] -= 1
+                stats['requests'] += 1
+        latency_ms = (time.perf_counter() - started) * 1000
+        with node_stats_lock:
+            stats['latency_ms'] += LATENCY_EWMA_ALPHA * (latency_ms - stats['latency_ms'])
+            stats['last_status'] = response.meta.status
+            stats['healthy'] = response.meta.status < 500
+            stats['updated_at'] = time.time()
+        return response
+
+
+class LeastLoadedSelector(NodeSelector):
+    """Pick the less loaded of two random healthy nodes (fewest in-flight requests, then latency).
+
+    Comparing two random nodes instead of taking the global minimum keeps
+    sending some requests to every node, and a node's latency decays toward
+    the pool mean while it is not used, so one slow answer does not shut a
+    node out for good. Unhealthy nodes are skipped until UNHEALTHY_RETRY_SECONDS
+    have passed, unless no node is healthy.
+    """
+
+    def select(self, nodes):
+        now = time.time()
+        with node_stats_lock:
+            stats = {node.base_url: dict(node_stats.get(node.base_url) or {}) for node in nodes}
+        usable = [node for node in nodes
+                  if stats[node.base_url].get('healthy', True)
+                  or now - stats[node.base_url]['updated_at'] >= UNHEALTHY_RETRY_SECONDS]
+        candidates = usable or list(nodes)
+        latencies = [s['latency_ms'] for s in stats.values() if s]
+        mean = sum(latencies) / len(latencies) if latencies else 0.0
+
+        def load(node):
+            s = stats[node.base_url]
+            if not s:
+                return (0, 0.0)
+            decay = 0.5 ** ((now - s['updated_at']) / LATENCY_HALF_LIFE_SECONDS)
+            return (s['in_flight'], mean + (s['latency_ms'] - mean) * decay)
+        first, second = random.choice(candidates), random.choice(candidates)
+        return min((first, second), key=load)
+
+
+NODE_SELECTORS = {
+    'round_robin': 'round_robin',
+    'least_loaded': LeastLoadedSelector,
+}
+
+
+def create_elasticsearch_client(hosts, selector='round_robin', sniff=False, compress=True):
+    """Elasticsearch client with pooled connections to every host.
+
+    `selector` is 'round_robin' or 'least_loaded'. With `sniff` the client
+    discovers the rest of the cluster on start and after node failures, and
+    `compress` gzips request bodies, which matters most for bulk requests.
+    """
+    return Elasticsearch(
+        hosts,
+        node_class=StatsHttpNode,
+        node_selector_class=NODE_SELECTORS[selector],
+        connections_per_node=ES_CONNECTIONS_PER_NODE,
+        http_compress=compress,
+        sniff_on_start=sniff,
+        sniff_on_node_failure=sniff,
+        min_delay_between_sniffing=ES_SNIFF_INTERVAL,
+        # 429 and 5xx answers go straight to the bulk indexer, whose flow control backs off
+        retry_on_status=(),
+    )
+
+
+def get_node_stats():
+    with node_stats_lock:
+        return {base_url: dict(stats) for base_url, stats in node_stats.items()}
+
+
+def print_node_stats():
+    for base_url, stats in sorted(get_node_stats().items()):
+        health = "healthy" if stats['healthy'] else "unhealthy"
+        print(f"{base_url} - {health} - {stats['requests']} requests, {stats['errors']} errors, "
+              f"{stats['latency_ms']:.1f} ms avg latency, {stats['in_flight']} in flight")
@@ -0,0 +1,461 @@
+import argparse
+import asyncio
+import gzip
+import json
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import msgpack
+
+from reconnect import LazyConnection
+
+KAFKA_BROKER = 'localhost:9092'
+ELASTICSEARCH_HOSTS = ['http://localhost:9200']
+GATEWAY_HOST = '0.0.0.0'
+GATEWAY_PORTS = [24225, 24226, 24227]    # the ports of p_fluent.conf, s_fluent.conf and u_fluent.conf
+GATEWAY_ROUTES = {
+    'services.service_logs': 'service_logs',
+    'services.alert_logs': 'alert_logs',
+    'services.health_logs': 'health_logs',
+}
+GATEWAY_FLUSH_SECONDS = {               # flush a route once its oldest buffered record is this old...
+    'service_logs': 1.0,
+    'alert_logs': 0.05,
+    'health_logs': 1.0,
+}
+GATEWAY_CHUNK_LIMIT_BYTES = 1024 * 1024           # ...or once this much is buffered
+GATEWAY_TOTAL_LIMIT_BYTES = 128 * 1024 * 1024     # stop reading from clients while a route buffers this much
+GATEWAY_READ_BYTES = 256 * 1024
+GATEWAY_RETRY_MAX_SECONDS = 30
+GATEWAY_ACK_ON = 'delivery'             # 'delivery': ack once the chunk is in Kafka/ES; 'buffer': on receipt, like Fluentd
+BENCH_WINDOW = 256                      # benchmark chunks awaiting an ack; covers a 1 s flush deadline at 250k records/s
+KAFKA_COMPRESSION = 'gzip'              # 'gzip', or 'lz4'/'snappy'/'zstd' when their codecs are installed
+KAFKA_LINGER_MS = 5
+KAFKA_BATCH_BYTES = 256 * 1024
+
+
+def encode_record(record):
+    return json.dumps(record, default=str).encode('utf-8')
+
+
+class KafkaSink:
+    """Produces each route's records to its topic as JSON, like Fluentd's kafka2 output with a json format"""
+
+    def __init__(self, bootstrap_servers=KAFKA_BROKER, compression=KAFKA_COMPRESSION):
+        from kafka import KafkaProducer
+        self.connection = LazyConnection(
+            'Kafka producer',
+            lambda: KafkaProducer(
+                bootstrap_servers=bootstrap_servers,
+                compression_type=compression,
+                linger_ms=KAFKA_LINGER_MS,
+                batch_size=KAFKA_BATCH_BYTES,
+                acks=1
+            )
+        )
+
+    def deliver(self, topic, records):
+        producer = self.connection.wait_ready()
+        futures = [producer.send(topic, encode_record(record)) for record in records]
+        producer.flush()
+        for future in futures:
+            # Raises if the record could not be written, so the whole chunk is retried
+            future.get(timeout=0)
+
+    def close(self):
+        producer = self.connection.get()
+        if producer is not None:
+            producer.flush()
+        self.connection.close()
+
+
+class ElasticsearchSink:
+    """Bulk-indexes each route's records into the index named after its topic"""
+
+    def __init__(self, hosts=ELASTICSEARCH_HOSTS):
+        from bulk_indexer import BulkIndexer
+        from dead_letter import DeadLetterSink
+        from es_pool import create_elasticsearch_client
+        self.connection = LazyConnection(
+            'Elasticsearch',
+            lambda: create_elasticsearch_client(hosts),
+            lambda client: client.ping()
+        )
+        self.indexer_class = BulkIndexer
+        self.indexers = {}
+        self.dead_letters = DeadLetterSink()
+
+    def deliver(self, topic, records):
+        from dedup import get_document_id
+        # Routes flush from their own threads and a BulkIndexer is not thread-safe, so each gets one
+        indexer = self.indexers.get(topic)
+        if indexer is None:
+            indexer = self.indexers[topic] = self.indexer_class(self.connection, dead_letters=self.dead_letters)
+        for record in records:
+            indexer.add(topic, get_document_id(record), record)
+        while indexer.pending:
+            self.connection.wait_ready()
+            time.sleep(indexer.controller.backoff_remaining())
+            indexer.flush()
+
+    def close(self):
+        for indexer in self.indexers.values():
+            indexer.close()
+        self.connection.close()
+        self.dead_letters.close()
+
+
+class NullSink:
+    """Encodes records like the Kafka sink and drops them; used to measure the gateway on its own"""
+
+    def deliver(self, topic, records):
+        for record in records:
+            encode_record(record)
+
+    def close(self):
+        pass
+
+
+class Route:
+    __slots__ = ('topic', 'flush_seconds', 'records', 'size', 'oldest', 'chunk', 'ready', 'full', 'drained',
+                 'flushed', 'flushes')
+
+    def __init__(self, topic, flush_seconds):
+        self.topic = topic
+        self.flush_seconds = flush_seconds
+        self.records = []
+        self.size = 0
+        self.oldest = None
+        self.chunk = None
+        self.ready = asyncio.Event()
+        self.full = asyncio.Event()
+        self.drained = asyncio.Event()
+        self.flushed = 0
+        self.flushes = 0
+
+    def add(self, records, size):
+        """Buffer records; the returned future resolves once the chunk they joined has been delivered"""
+        if not self.records:
+            self.oldest = time.monotonic()
+            self.chunk = asyncio.get_running_loop().create_future()
+            self.ready.set()
+        self.records.extend(records)
+        self.size += size
+        if self.size >= GATEWAY_CHUNK_LIMIT_BYTES:
+            self.full.set()
+        return self.chunk
+
+    def take(self):
+        records, chunk = self.records, self.chunk
+        self.records, self.size, self.oldest, self.chunk = [], 0, None, None
+        self.ready.clear()
+        self.full.clear()
+        return records, chunk
+
+
+class FluentGateway:
+    """Fluent forward protocol server that writes records straight to Kafka or Elasticsearch.
+
+    Accepts Message, Forward, PackedForward and CompressedPackedForward
+    events from fluent-logger and Fluentd/Fluent Bit forwarders. Records are
+    buffered per tag route and flushed as one chunk when the oldest has waited
+    the route's flush time or the chunk limit is reached; a client that asks
+    for an ack gets it once its chunk has been delivered (or, with
+    ack_on='buffer', as soon as it is buffered). While a route
+    is over its buffer limit the gateway stops reading from its clients.
+    """
+
+    def __init__(self, sink, routes=GATEWAY_ROUTES, flush_seconds=GATEWAY_FLUSH_SECONDS, ack_on=GATEWAY_ACK_ON):
+        self.sink = sink
+        self.ack_on = ack_on
+        self.routes_by_tag = {}
+        self.routes = []
+        for tag, topic in routes.items():
+            route = Route(topic, flush_seconds.get(topic, 1.0))
+            self.routes_by_tag[tag] = route
+            self.routes.append(route)
+        # One thread per route, so a slow service_logs flush never holds back alert_logs
+        self.executor = ThreadPoolExecutor(max_workers=len(self.routes), thread_name_prefix='gateway-flush')
+        self.servers = []
+        self.tasks = []
+        self.stats = Counter()
+        self.unmatched_tags = set()
+
+    async def start(self, host=GATEWAY_HOST, ports=GATEWAY_PORTS):
+        for route in self.routes:
+            self.tasks.append(asyncio.create_task(self._flush_loop(route)))
+        for port in ports:
+            server = await asyncio.start_server(self._handle, host, port, limit=GATEWAY_READ_BYTES)
+            self.servers.append(server)
+            print(f"Fluent forward gateway listening on {host}:{server.sockets[0].getsockname()[1]}")
+        return self.servers
+
+    async def _handle(self, reader, writer):
+        self.stats['connections'] += 1
+        unpacker = msgpack.Unpacker(raw=False, unicode_errors='surrogateescape', max_buffer_size=64 * 1024 * 1024)
+        try:
+            while True:
+                data = await reader.read(GATEWAY_READ_BYTES)
+                if not data:
+                    break
+                unpacker.feed(data)
+                start = unpacker.tell()
+                for message in unpacker:
+                    end = unpacker.tell()
+                    await self._receive(message, end - start, writer)
+                    start = end
+        except (ValueError, TypeError, IndexError, KeyError, msgpack.UnpackException) as e:
+            self.stats['protocol_errors'] += 1
+            print(f"Closing forward connection after malformed data: {type(e).__name__} {e}")
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _receive(self, message, size, writer):
+        if not isinstance(message, (list, tuple)) or len(message) < 2:
+            raise ValueError(f"expected a forward event array, got {type(message).__name__}")
+        tag, entries = message[0], message[1]
+        if isinstance(entries, (bytes, str)):
+            option = message[2] if len(message) > 2 else None
+            records = decode_packed_entries(entries, option)
+        elif isinstance(entries, list):
+            # Not any tuple: an EventTime arrives as msgpack.ExtType, which is a namedtuple
+            option = message[2] if len(message) > 2 else None
+            records = [entry[1] for entry in entries]
+        else:
+            # Message mode: [tag, time, record, option], with time an integer, float or EventTime
+            option = message[3] if len(message) > 3 else None
+            records = [message[2]]
+        self.stats['records'] += len(records)
+
+        route = self.routes_by_tag.get(tag)
+        chunk = None
+        if route is None:
+            self.stats['unmatched'] += len(records)
+            if tag not in self.unmatched_tags:
+                self.unmatched_tags.add(tag)
+                print(f"WARNING: no route for tag {tag}, dropping its records")
+        else:
+            while route.size >= GATEWAY_TOTAL_LIMIT_BYTES:
+                route.drained.clear()
+                await route.drained.wait()
+            chunk = route.add(records, size)
+
+        if isinstance(option, dict) and 'chunk' in option:
+            ack = msgpack.packb({'ack': option['chunk']})
+            if chunk is None or self.ack_on == 'buffer':
+                writer.write(ack)
+            else:
+                # Keep reading while the chunk waits for its flush; acks carry their chunk id
+                chunk.add_done_callback(lambda _: writer.is_closing() or writer.write(ack))
+
+    async def _flush_loop(self, route):
+        loop = asyncio.get_running_loop()
+        while True:
+            await route.ready.wait()
+            remaining = route.oldest + route.flush_seconds - time.monotonic()
+            if remaining > 0 and not route.full.is_set():
+                try:
+                    await asyncio.wait_for(route.full.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+            records, chunk = route.take()
+            route.drained.set()
+            delay = 0.5
+            while True:
+                try:
+                    await loop.run_in_executor(self.executor, self.sink.deliver, route.topic, records)
+                    break
+                except Exception as e:
+                    print(f"Delivering {len(records)} {route.topic} records failed, retrying in {delay}s: {e}")
+                    await asyncio.sleep(delay)
+                    delay = min(GATEWAY_RETRY_MAX_SECONDS, delay * 2)
+            route.flushes += 1
+            route.flushed += len(records)
+            chunk.set_result(len(records))
+
+    async def close(self):
+        for server in self.servers:
+            server.close()
+            await server.wait_closed()
+        # Give routes one last flush so buffered records are not lost
+        for route in self.routes:
+            route.full.set()
+        deadline = time.monotonic() + GATEWAY_RETRY_MAX_SECONDS
+        while any(route.records for route in self.routes) and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.executor.shutdown(wait=True)
+        self.sink.close()
+
+    def print_stats(self):
+        print(f"Gateway: {self.stats['records']} records on {self.stats['connections']} connections, "
+              f"{self.stats['unmatched']} unmatched, {self.stats['protocol_errors']} protocol errors")
+        for route in self.routes:
+            print(f"Route {route.topic}: {route.flushed} records in {route.flushes} flushes "
+                  f"(flush after {route.flush_seconds}s)")
+
+
+def decode_packed_entries(entries, option=None):
+    """Records of a PackedForward event, gunzipping CompressedPackedForward entries first"""
+    if isinstance(entries, str):
+        entries = entries.encode('utf-8', 'surrogateescape')
+    if isinstance(option, dict) and option.get('compressed') == 'gzip':
+        entries = gzip.decompress(entries)
+    unpacker = msgpack.Unpacker(raw=False, unicode_errors='surrogateescape', max_buffer_size=len(entries))
+    unpacker.feed(entries)
+    return [entry[1] for entry in unpacker]
+
+
+def route_tag(log_data):
+    """The tag payment.py, stock.py and user.py emit a record under"""
+    if log_data.get('message_type') in ('HEARTBEAT', 'REGISTRATION'):
+        return 'services.health_logs'
+    if log_data.get('log_level') in ('FATAL', 'ALERT'):
+        return 'services.alert_logs'
+    return 'services.service_logs'
+
+
+def build_benchmark_events(records, mode='packed', batch=1000):
+    """Pre-packed (event, asks for ack) pairs for `records` synthetic logs, one ack per batch"""
+    from synthetic_logs import SyntheticLogGenerator
+
+    logs = []
+    for _, blocks in SyntheticLogGenerator(seed=1).chunks(records):
+        for block in blocks:
+            logs.extend(json.loads(line) for line in block.tobytes().splitlines())
+    now = int(time.time())
+    events = []
+    for start in range(0, len(logs), batch):
+        chunk_id = f"bench-{start}"
+        group = logs[start:start + batch]
+        if mode == 'message':
+            for log in group[:-1]:
+                events.append((msgpack.packb([route_tag(log), now, log]), False))
+            events.append((msgpack.packb([route_tag(group[-1]), now, group[-1], {'chunk': chunk_id}]), True))
+            continue
+        by_tag = {}
+        for log in group:
+            by_tag.setdefault(route_tag(log), []).append(msgpack.packb([now, log]))
+        tags = list(by_tag)
+        for tag in tags:
+            option = {'size': len(by_tag[tag])}
+            if tag == tags[-1]:
+                option['chunk'] = chunk_id
+            events.append((msgpack.packb([tag, b''.join(by_tag[tag]), option]), 'chunk' in option))
+    return events, len(logs)
+
+
+async def run_benchmark_client(host, port, events, window=BENCH_WINDOW):
+    """Send events keeping `window` acks outstanding; returns seconds until the last ack"""
+    reader, writer = await asyncio.open_connection(host, port)
+    unpacker = msgpack.Unpacker(raw=False)
+    slots = asyncio.Semaphore(window)
+    expected = sum(1 for _, wants_ack in events if wants_ack)
+    acked = 0
+
+    async def read_acks():
+        nonlocal acked
+        try:
+            while acked < expected:
+                data = await reader.read(65536)
+                if not data:
+                    raise ConnectionError("connection closed before every chunk was acknowledged")
+                unpacker.feed(data)
+                for _ in unpacker:
+                    acked += 1
+                    slots.release()
+        finally:
+            for _ in range(window):
+                slots.release()
+
+    started = time.perf_counter()
+    acks = asyncio.create_task(read_acks())
+    for event, wants_ack in events:
+        if wants_ack:
+            await slots.acquire()
+            if acks.done():
+                break
+        writer.write(event)
+        if writer.transport.get_write_buffer_size() > GATEWAY_READ_BYTES:
+            await writer.drain()
+    await writer.drain()
+    await acks
+    elapsed = time.perf_counter() - started
+    writer.close()
+    return elapsed
+
+
+async def benchmark(records, mode='packed', target=None, batch=1000):
+    """Records per second from a forward client up to the last ack, by what was measured.
+
+    Without `target` the in-process gateway is measured twice: acking on
+    buffer, as Fluentd does, and acking on delivery.
+    """
+    events, count = build_benchmark_events(records, mode, batch)
+    if target is not None:
+        host, port = target.rsplit(':', 1)
+        return {target: count / await run_benchmark_client(host, int(port), events)}
+    results = {}
+    for ack_on in ('buffer', 'delivery'):
+        gateway = FluentGateway(NullSink(), ack_on=ack_on)
+        servers = await gateway.start('127.0.0.1', [0])
+        elapsed = await run_benchmark_client('127.0.0.1', servers[0].sockets[0].getsockname()[1], events)
+        await gateway.close()
+        results[f"gateway, ack on {ack_on}"] = count / elapsed
+    return results
+
+
+def parse_flush_seconds(values):
+    flush_seconds = dict(GATEWAY_FLUSH_SECONDS)
+    for value in values or ():
+        topic, _, seconds = value.partition('=')
+        flush_seconds[topic] = float(seconds)
+    return flush_seconds
+
+
+async def serve(sink, ports, flush_seconds, ack_on):
+    gateway = FluentGateway(sink, flush_seconds=flush_seconds, ack_on=ack_on)
+    await gateway.start(GATEWAY_HOST, ports)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await gateway.close()
+        gateway.print_stats()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fluent forward gateway writing to Kafka or Elasticsearch")
+    parser.add_argument('--sink', choices=['kafka', 'elasticsearch', 'null'], default='kafka')
+    parser.add_argument('--ports', type=int, nargs='+', default=GATEWAY_PORTS)
+    parser.add_argument('--flush', nargs='+', metavar='TOPIC=SECONDS',
+                        help="flush deadline per route, e.g. alert_logs=0.02 service_logs=2")
+    parser.add_argument('--compression', default=KAFKA_COMPRESSION)
+    parser.add_argument('--ack-on', choices=['delivery', 'buffer'], default=GATEWAY_ACK_ON,
+                        help="when to ack a chunk while serving (the benchmark measures both)")
+    parser.add_argument('--bench', type=int, metavar='RECORDS',
+                        help="measure forward throughput instead of serving")
+    parser.add_argument('--mode', choices=['packed', 'message'], default='packed',
+                        help="benchmark events: PackedForward batches or one Message per record")
+    parser.add_argument('--target', metavar='HOST:PORT',
+                        help="benchmark a running forward server (e.g. Fluentd) instead of an in-process gateway")
+    args = parser.parse_args()
+
+    if args.bench:
+        for label, rate in asyncio.run(benchmark(args.bench, args.mode, args.target)).items():
+            print(f"{label}, {args.mode} mode: {rate:,.0f} records/s")
+    else:
+        if args.sink == 'kafka':
+            sink = KafkaSink(compression=args.compression)
+        elif args.sink == 'elasticsearch':
+            sink = ElasticsearchSink()
+        else:
+            sink = NullSink()
+        try:
+            asyncio.run(serve(sink, args.ports, parse_flush_seconds(args.flush), args.ack_on))
+        except KeyboardInterrupt:
+            pass
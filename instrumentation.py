@@ -0,0 +1,217 @@
+import functools
+import json
+import os
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+PROFILE_DIR = 'profiles'
+PROFILE_SECONDS = 10          # length of a sampling profile
+PROFILE_INTERVAL = 0.005      # seconds between stack samples
+ALLOCATION_TOP_N = 25
+TRACEMALLOC_FRAMES = 10
+
+
+class _State:
+    enabled = False
+    name = 'process'
+    profiling = False
+
+
+state = _State()
+stage_stats = {}    # stage -> [calls, total seconds, max seconds]
+counters = Counter()
+stats_lock = threading.Lock()
+
+
+def instrumented(stage):
+    """Time every call of the decorated function under `stage` while instrumentation is on.
+
+    When it is off the wrapper only checks a flag before calling through.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not state.enabled:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(stage, time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+def record(stage, seconds):
+    with stats_lock:
+        stats = stage_stats.get(stage)
+        if stats is None:
+            stats = stage_stats[stage] = [0, 0.0, 0.0]
+        stats[0] += 1
+        stats[1] += seconds
+        if seconds > stats[2]:
+            stats[2] = seconds
+
+
+def count(name, amount=1):
+    if state.enabled:
+        with stats_lock:
+            counters[name] += amount
+
+
+def enable():
+    state.enabled = True
+
+
+def disable():
+    state.enabled = False
+
+
+def snapshot_stats():
+    with stats_lock:
+        return {
+            'stages': {
+                stage: {
+                    'calls': calls,
+                    'total_ms': round(total * 1000, 3),
+                    'avg_us': round(total / calls * 1000000, 3) if calls else 0,
+                    'max_ms': round(longest * 1000, 3),
+                }
+                for stage, (calls, total, longest) in stage_stats.items()
+            },
+            'counters': dict(counters),
+        }
+
+
+def _dump_path(kind, extension):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stamp = time.strftime('%Y%m%d-%H%M%S')
+    return os.path.join(PROFILE_DIR, f"{state.name}-{os.getpid()}-{stamp}-{kind}.{extension}")
+
+
+def dump_stats():
+    path = _dump_path('stats', 'json')
+    with open(path, 'w') as f:
+        json.dump(snapshot_stats(), f, indent=2)
+    return path
+
+
+def dump_allocations():
+    """Write the top allocation sites as text and the full snapshot for tracemalloc.Snapshot.load"""
+    if not tracemalloc.is_tracing():
+        return None
+    snapshot = tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+    ])
+    # Tracing slows every allocation, so it only runs between two dump requests
+    tracemalloc.stop()
+    snapshot.dump(_dump_path('alloc', 'snapshot'))
+    path = _dump_path('alloc', 'txt')
+    with open(path, 'w') as f:
+        for line in snapshot.statistics('lineno')[:ALLOCATION_TOP_N]:
+            f.write(f"{line}\n")
+    return path
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def sample_profile(seconds=None, interval=None):
+    """Sample every thread's stack and write collapsed stacks.
+
+    The `.folded` output is the format read by flamegraph.pl and speedscope.
+    """
+    seconds = seconds or PROFILE_SECONDS
+    interval = interval or PROFILE_INTERVAL
+    me = threading.get_ident()
+    names = {}
+    stacks = Counter()
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        for thread in threading.enumerate():
+            names[thread.ident] = thread.name
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == me:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            labels.append(names.get(thread_id, str(thread_id)))
+            stacks[';'.join(reversed(labels))] += 1
+        time.sleep(interval)
+
+    path = _dump_path('cpu', 'folded')
+    with open(path, 'w') as f:
+        for stack, samples in stacks.most_common():
+            f.write(f"{stack} {samples}\n")
+    return path
+
+
+def _in_background(target, name):
+    # Printing or writing files inside a signal handler can re-enter the main thread's
+    # stdout buffer, so handlers only flip state and hand the rest to a thread
+    worker = threading.Thread(target=target, name=name)
+    worker.daemon = True
+    worker.start()
+
+
+def _profile_in_background():
+    if state.profiling:
+        return
+    state.profiling = True
+
+    def run():
+        try:
+            path = sample_profile()
+            print(f"Sampling profile written to {path}")
+        finally:
+            state.profiling = False
+
+    _in_background(run, 'sampling-profiler')
+
+
+def _toggle_handler(signum, frame):
+    if state.enabled:
+        disable()
+        _in_background(
+            lambda: print(f"Instrumentation disabled, stats written to {dump_stats()}"),
+            'instrumentation-toggle'
+        )
+    else:
+        enable()
+        _in_background(lambda: print("Instrumentation enabled"), 'instrumentation-toggle')
+
+
+def _dump_handler(signum, frame):
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+
+    def run():
+        print(f"Stage stats written to {dump_stats()}")
+        if tracing:
+            print(f"Allocation top {ALLOCATION_TOP_N} written to {dump_allocations()}")
+        else:
+            print("Allocation tracing started, send the signal again to write the top allocations")
+
+    _in_background(run, 'instrumentation-dump')
+    _profile_in_background()
+
+
+def install_signal_handlers(name):
+    """SIGUSR1 toggles stage timers and counters.
+
+    SIGUSR2 writes the stage stats and a sampling CPU profile, and alternately
+    starts allocation tracing and writes its top allocation sites.
+    """
+    state.name = name
+    if hasattr(signal, 'SIGUSR1'):
+        signal.signal(signal.SIGUSR1, _toggle_handler)
+        signal.signal(signal.SIGUSR2, _dump_handler)
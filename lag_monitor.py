@@ -0,0 +1,259 @@
+import argparse
+import json
+import threading
+import time
+
+from kafka import KafkaAdminClient, KafkaConsumer, TopicPartition
+
+KAFKA_BROKER = 'localhost:9092'
+CONSUMER_GROUP = 'log_consumer_group'
+LAG_TOPICS = ['service_logs', 'alert_logs', 'health_logs']
+LAG_SAMPLE_SECONDS = 10
+LAG_RATE_ALPHA = 0.3                 # EWMA weight of the newest rate sample
+LAG_SCALE_OUT_RECORDS = 100000       # lag that counts as falling behind...
+LAG_SCALE_OUT_SECONDS = 60           # ...or lag in seconds of ingest that does
+LAG_SCALE_OUT_SUSTAIN_SECONDS = 300  # how long the group must stay behind before asking to scale out
+
+
+class KafkaOffsetSource:
+    """Committed and log-end offsets from a Kafka cluster.
+
+    Any object with the same three methods (a stand-in for a local test broker,
+    say) can be given to LagMonitor instead; its close() is called if it has one.
+    """
+
+    def __init__(self, bootstrap_servers=KAFKA_BROKER):
+        self.admin = KafkaAdminClient(bootstrap_servers=bootstrap_servers, client_id='lag-monitor')
+        self.consumer = KafkaConsumer(bootstrap_servers=bootstrap_servers, group_id=None,
+                                      enable_auto_commit=False, client_id='lag-monitor')
+
+    def partitions(self, topics):
+        return [(topic, partition) for topic in topics
+                for partition in sorted(self.consumer.partitions_for_topic(topic) or ())]
+
+    def committed_offsets(self, group, partitions):
+        committed = self.admin.list_consumer_group_offsets(group)
+        offsets = {(tp.topic, tp.partition): meta.offset for tp, meta in committed.items() if meta.offset >= 0}
+        missing = [TopicPartition(topic, partition) for topic, partition in partitions if (topic, partition) not in offsets]
+        if missing:
+            # Nothing committed yet: with auto_offset_reset='earliest' the group starts from the beginning
+            for tp, offset in self.consumer.beginning_offsets(missing).items():
+                offsets[(tp.topic, tp.partition)] = offset
+        return offsets
+
+    def end_offsets(self, partitions):
+        ends = self.consumer.end_offsets([TopicPartition(topic, partition) for topic, partition in partitions])
+        return {(tp.topic, tp.partition): offset for tp, offset in ends.items()}
+
+    def close(self):
+        self.admin.close()
+        self.consumer.close()
+
+
+class PartitionLag:
+    __slots__ = ('committed', 'end', 'sampled_at', 'ingest_rate', 'drain_rate', 'lag_growth')
+
+    def __init__(self, committed, end, sampled_at):
+        self.committed = committed
+        self.end = end
+        self.sampled_at = sampled_at
+        self.ingest_rate = None
+        self.drain_rate = None
+        self.lag_growth = None
+
+    @property
+    def lag(self):
+        return max(0, self.end - self.committed)
+
+
+def _ewma(previous, sample):
+    return sample if previous is None else previous + LAG_RATE_ALPHA * (sample - previous)
+
+
+class LagMonitor:
+    """Per-partition consumer lag with ingest and drain rates from successive samples.
+
+    Lag in seconds is the lag divided by the ingest rate (how long the
+    producers took to write what is still unread); the ETA is the lag divided
+    by the net drain rate. The group is asked to scale out once it has stayed
+    above the record or seconds threshold for LAG_SCALE_OUT_SUSTAIN_SECONDS
+    without the lag shrinking.
+    """
+
+    def __init__(self, source, group=CONSUMER_GROUP, topics=LAG_TOPICS):
+        self.source = source
+        self.group = group
+        self.topics = topics
+        self.partitions = {}
+        self.behind_since = None
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.worker = None
+
+    def sample(self, now=None):
+        now = time.time() if now is None else now
+        partitions = self.source.partitions(self.topics)
+        committed = self.source.committed_offsets(self.group, partitions)
+        ends = self.source.end_offsets(partitions)
+        with self.lock:
+            for key in partitions:
+                current = PartitionLag(committed.get(key, 0), ends.get(key, 0), now)
+                previous = self.partitions.get(key)
+                if previous is not None and now > previous.sampled_at:
+                    elapsed = now - previous.sampled_at
+                    current.ingest_rate = _ewma(previous.ingest_rate, (current.end - previous.end) / elapsed)
+                    current.drain_rate = _ewma(previous.drain_rate, (current.committed - previous.committed) / elapsed)
+                    current.lag_growth = _ewma(previous.lag_growth, (current.lag - previous.lag) / elapsed)
+                self.partitions[key] = current
+            self._update_scale_out(now)
+        return self.report(now)
+
+    def _update_scale_out(self, now):
+        total = self._totals()
+        behind = total['lag'] >= LAG_SCALE_OUT_RECORDS or (
+            total['lag_seconds'] is not None and total['lag_seconds'] >= LAG_SCALE_OUT_SECONDS)
+        if behind and (total['lag_growth'] is None or total['lag_growth'] >= 0):
+            if self.behind_since is None:
+                self.behind_since = now
+        else:
+            self.behind_since = None
+
+    def _totals(self):
+        lag = sum(p.lag for p in self.partitions.values())
+        ingest = _sum_rates(p.ingest_rate for p in self.partitions.values())
+        drain = _sum_rates(p.drain_rate for p in self.partitions.values())
+        growth = _sum_rates(p.lag_growth for p in self.partitions.values())
+        # The group is as far behind as its slowest partition
+        lag_seconds = [_lag_seconds(p.lag, p.ingest_rate) for p in self.partitions.values()]
+        lag_seconds = [seconds for seconds in lag_seconds if seconds is not None]
+        return {
+            'lag': lag,
+            'lag_seconds': max(lag_seconds) if lag_seconds else None,
+            'ingest_rate': ingest,
+            'drain_rate': drain,
+            'lag_growth': growth,
+            'eta_seconds': _eta(lag, growth),
+        }
+
+    def report(self, now=None):
+        now = time.time() if now is None else now
+        with self.lock:
+            partitions = []
+            for (topic, partition), p in sorted(self.partitions.items()):
+                partitions.append({
+                    'topic': topic,
+                    'partition': partition,
+                    'committed': p.committed,
+                    'end': p.end,
+                    'lag': p.lag,
+                    'lag_seconds': _lag_seconds(p.lag, p.ingest_rate),
+                    'ingest_rate': _round(p.ingest_rate),
+                    'drain_rate': _round(p.drain_rate),
+                    'lag_growth': _round(p.lag_growth),
+                    'eta_seconds': _eta(p.lag, p.lag_growth),
+                })
+            total = self._totals()
+            behind_for = now - self.behind_since if self.behind_since is not None else 0
+        total = {key: _round(value) for key, value in total.items()}
+        total['behind_for_seconds'] = round(behind_for, 1)
+        total['scale_out'] = behind_for >= LAG_SCALE_OUT_SUSTAIN_SECONDS
+        return {'group': self.group, 'partitions': partitions, 'total': total}
+
+    def start(self, interval=LAG_SAMPLE_SECONDS):
+        """Sample in a background thread until stop()"""
+        def run():
+            while not self.stopped.is_set():
+                try:
+                    self.sample()
+                except Exception as e:
+                    print(f"Lag monitor sample failed: {e}")
+                self.stopped.wait(interval)
+        self.worker = threading.Thread(target=run, name='lag-monitor')
+        self.worker.daemon = True
+        self.worker.start()
+
+    def stop(self, timeout=LAG_SAMPLE_SECONDS):
+        """Stop sampling and close the offset source"""
+        self.stopped.set()
+        if self.worker is not None:
+            # Let a sample in progress finish before its clients are closed
+            self.worker.join(timeout)
+        close = getattr(self.source, 'close', None)
+        if close is not None:
+            try:
+                close()
+            except Exception as e:
+                print(f"Lag monitor close failed: {e}")
+
+
+def _sum_rates(rates):
+    rates = [rate for rate in rates if rate is not None]
+    return sum(rates) if rates else None
+
+
+def _lag_seconds(lag, ingest_rate):
+    if not lag:
+        return 0.0
+    if not ingest_rate or ingest_rate <= 0:
+        return None
+    return round(lag / ingest_rate, 1)
+
+
+def _eta(lag, lag_growth):
+    """Seconds until the lag is gone at the current net drain rate (None if it is not shrinking)"""
+    if not lag:
+        return 0.0
+    if lag_growth is None or lag_growth >= 0:
+        return None
+    return round(lag / -lag_growth, 1)
+
+
+def _round(value):
+    return round(value, 1) if isinstance(value, float) else value
+
+
+def _format(value, suffix=''):
+    return '-' if value is None else f"{value}{suffix}"
+
+
+def print_lag_report(report):
+    print(f"Consumer group {report['group']}")
+    print(f"{'topic':<16}{'part':>5}{'committed':>12}{'end':>12}{'lag':>10}{'lag s':>9}"
+          f"{'in/s':>9}{'out/s':>9}{'growth/s':>10}{'eta s':>9}")
+    for p in report['partitions']:
+        print(f"{p['topic']:<16}{p['partition']:>5}{p['committed']:>12}{p['end']:>12}{p['lag']:>10}"
+              f"{_format(p['lag_seconds']):>9}{_format(p['ingest_rate']):>9}{_format(p['drain_rate']):>9}"
+              f"{_format(p['lag_growth']):>10}{_format(p['eta_seconds']):>9}")
+    total = report['total']
+    print(f"Total lag {total['lag']} records ({_format(total['lag_seconds'], ' s')} of ingest), "
+          f"ETA {_format(total['eta_seconds'], ' s')}, growth {_format(total['lag_growth'], '/s')}")
+    if total['scale_out']:
+        print(f"SCALE OUT: lag has stayed above threshold for {total['behind_for_seconds']} s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report lag of a Kafka consumer group")
+    parser.add_argument('--broker', default=KAFKA_BROKER)
+    parser.add_argument('--group', default=CONSUMER_GROUP)
+    parser.add_argument('--topics', nargs='+', default=LAG_TOPICS)
+    parser.add_argument('--interval', type=float, default=LAG_SAMPLE_SECONDS)
+    parser.add_argument('--once', action='store_true', help="print one sample and exit (no rates)")
+    parser.add_argument('--json', action='store_true', help="print reports as JSON lines")
+    args = parser.parse_args()
+
+    source = KafkaOffsetSource(args.broker)
+    monitor = LagMonitor(source, args.group, args.topics)
+    try:
+        while True:
+            report = monitor.sample()
+            if args.json:
+                print(json.dumps(report))
+            else:
+                print_lag_report(report)
+            if args.once:
+                break
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        source.close()
@@ -0,0 +1,57 @@
+import time
+from collections import deque
+
+LANE_LATENCY_SAMPLES = 10000   # most recent end-to-end latencies kept per lane for percentiles
+
+
+class ConsumerLane:
+    """One Kafka consumer with its own topics, fetch settings and bulk indexer.
+
+    Lanes do not share a fetch queue or a bulk backoff, so a backlog in one
+    never delays another. Each lane records how long its records took from
+    being written to Kafka to being handed to the index.
+    """
+
+    def __init__(self, name, topics, connection, indexer, priority=False):
+        self.name = name
+        self.topics = topics
+        self.connection = connection
+        self.indexer = indexer
+        self.priority = priority
+        self.latencies = deque(maxlen=LANE_LATENCY_SAMPLES)
+        self.records = 0
+        self.batches = 0
+        self.max_latency = 0.0
+
+    def record_batch(self, messages):
+        """Record the Kafka-to-index latency of a batch that has just been flushed"""
+        now_ms = time.time() * 1000
+        self.batches += 1
+        self.records += len(messages)
+        for message in messages:
+            latency = max(0.0, now_ms - message.timestamp)
+            self.latencies.append(latency)
+            if latency > self.max_latency:
+                self.max_latency = latency
+
+    def latency_stats(self):
+        if not self.latencies:
+            return {'records': self.records, 'batches': self.batches}
+        ordered = sorted(self.latencies)
+        return {
+            'records': self.records,
+            'batches': self.batches,
+            'p50_ms': round(ordered[len(ordered) // 2], 1),
+            'p99_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))], 1),
+            'max_ms': round(self.max_latency, 1),
+        }
+
+
+def print_lane_stats(lanes):
+    for lane in lanes:
+        stats = lane.latency_stats()
+        if 'p50_ms' not in stats:
+            print(f"Lane {lane.name}: no records")
+            continue
+        print(f"Lane {lane.name}: {stats['records']} records in {stats['batches']} batches, "
+              f"latency p50 {stats['p50_ms']} ms, p99 {stats['p99_ms']} ms, max {stats['max_ms']} ms")
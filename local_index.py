@@ -0,0 +1,523 @@
+import argparse
+import bisect
+import heapq
+import json
+import mmap
+import os
+import re
+import shutil
+import threading
+import time
+from array import array
+from datetime import datetime, timedelta
+
+import pytz
+
+SEGMENT_MAX_DOCS = 50000        # flush the in-memory buffer into a segment at this size
+SEGMENT_FLUSH_INTERVAL = 5      # seconds between background flushes
+MERGE_MAX_SEGMENTS = 8          # merge once more than this many segments exist
+MERGE_MAX_DOCS = 5000000        # segments larger than this are left alone, and no merge produces more
+BITMAP_FIELDS = ['log_level', 'service_name', 'node_id', 'message_type', 'template_id']
+MAX_TOKEN_LENGTH = 32
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9_]+')
+
+
+def tokenize(text):
+    return {t for t in TOKEN_PATTERN.findall(text.lower()) if len(t) <= MAX_TOKEN_LENGTH}
+
+
+def to_micros(value):
+    """Convert an ISO timestamp or datetime into UTC epoch microseconds"""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            value = None
+    if not isinstance(value, datetime):
+        value = datetime.now(pytz.UTC)
+    if value.tzinfo is None:
+        value = pytz.utc.localize(value)
+    return int(value.timestamp() * 1000000)
+
+
+def _map_file(path, typecode=None):
+    """Memory-map a segment file read-only, optionally as a typed array view"""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            data = memoryview(b'')
+        else:
+            data = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    return data.cast(typecode) if typecode else data
+
+
+def _field_filters(log_level, service_name, node_id, message_type, template_id):
+    field_filters = {}
+    for field, value in (('log_level', log_level), ('service_name', service_name),
+                         ('node_id', node_id), ('message_type', message_type),
+                         ('template_id', template_id)):
+        if value is not None:
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            field_filters[field] = [str(v) for v in values]
+    return field_filters
+
+
+def _ids_to_bits(ids, length):
+    bitmap = bytearray(length)
+    for d in ids:
+        bitmap[d >> 3] |= 1 << (d & 7)
+    return int.from_bytes(bitmap, 'little')
+
+
+def _contains(posting, doc_id):
+    i = bisect.bisect_left(posting, doc_id)
+    return i < len(posting) and posting[i] == doc_id
+
+
+class _SortedTerms:
+    """Sequence view over the sorted term dictionary, so bisect can search it in place"""
+
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return bytes(self.data[self.offsets[i]:self.offsets[i + 1]])
+
+
+class Segment:
+    """An immutable, time-sorted, memory-mapped index segment"""
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        self.doc_count = meta['doc_count']
+        self.min_ts = meta['min_ts']
+        self.max_ts = meta['max_ts']
+        self.fields = meta['fields']
+        self.timestamps = _map_file(os.path.join(path, 'ts.bin'), 'q')
+        self.doc_offsets = _map_file(os.path.join(path, 'docs.idx'), 'Q')
+        self.docs = _map_file(os.path.join(path, 'docs.bin'))
+        self.bitmaps = _map_file(os.path.join(path, 'bitmaps.bin'))
+        # Values too rare for a bitmap are stored as sorted doc id arrays instead
+        field_postings_path = os.path.join(path, 'field_postings.bin')
+        if os.path.exists(field_postings_path):
+            self.field_postings = _map_file(field_postings_path, 'I')
+        else:
+            self.field_postings = array('I')
+        self.terms = _SortedTerms(
+            _map_file(os.path.join(path, 'terms.bin')),
+            _map_file(os.path.join(path, 'terms.idx'), 'Q'),
+        )
+        self.posting_offsets = _map_file(os.path.join(path, 'postings.idx'), 'Q')
+        self.postings = _map_file(os.path.join(path, 'postings.bin'), 'I')
+
+    def doc(self, doc_id):
+        return json.loads(bytes(self.docs[self.doc_offsets[doc_id]:self.doc_offsets[doc_id + 1]]))
+
+    def value_filter(self, field, values):
+        """Docs with any of the given field values, as (sorted ids, None) or (None, bitmap).
+
+        Ids are returned when every value is stored as a posting array, so
+        rare values never have to be expanded into a full-length bitmap.
+        """
+        locations = [self.fields.get(field, {}).get(value) for value in values]
+        locations = [location for location in locations if location]
+        if all(len(location) > 2 for location in locations):
+            postings = [self.field_postings[start:start + length] for start, length, _ in locations]
+            if len(postings) == 1:
+                return postings[0], None
+            return list(heapq.merge(*postings)), None
+        bits = 0
+        for location in locations:
+            if len(location) > 2:
+                ids = self.field_postings[location[0]:location[0] + location[1]]
+                bits |= _ids_to_bits(ids, (self.doc_count + 7) // 8)
+            else:
+                bits |= int.from_bytes(self.bitmaps[location[0]:location[0] + location[1]], 'little')
+        return None, bits
+
+    def posting(self, term):
+        key = term.encode('utf-8')
+        i = bisect.bisect_left(self.terms, key)
+        if i == len(self.terms) or self.terms[i] != key:
+            return None
+        return self.postings[self.posting_offsets[i]:self.posting_offsets[i + 1]]
+
+    def doc_range(self, start_us, end_us):
+        lo = bisect.bisect_left(self.timestamps, start_us) if start_us is not None else 0
+        hi = bisect.bisect_left(self.timestamps, end_us) if end_us is not None else self.doc_count
+        return lo, hi
+
+    def _filters(self, field_filters, tokens, lo, hi):
+        """The bitmap and posting lists a doc must match, or None if nothing can match"""
+        bits = ((1 << hi) - 1) ^ ((1 << lo) - 1)
+        postings = []
+        for field, values in field_filters.items():
+            ids, field_bits = self.value_filter(field, values)
+            if ids is not None:
+                if not len(ids):
+                    return None
+                postings.append(ids)
+            else:
+                bits &= field_bits
+                if not bits:
+                    return None
+        for token in tokens:
+            posting = self.posting(token)
+            if posting is None:
+                return None
+            postings.append(posting)
+        return bits.to_bytes((hi + 7) // 8, 'little'), postings
+
+    @staticmethod
+    def _walk_postings(bitmap_bytes, postings, lo, hi):
+        """Yield doc ids in every posting and the bitmap, newest first"""
+        postings = sorted(postings, key=len)
+        # Postings are sorted, so walk the shortest one newest-first and probe the rest
+        shortest = postings[0]
+        for i in range(bisect.bisect_left(shortest, hi) - 1, -1, -1):
+            d = shortest[i]
+            if d < lo:
+                break
+            if not bitmap_bytes[d >> 3] >> (d & 7) & 1:
+                continue
+            if all(_contains(posting, d) for posting in postings[1:]):
+                yield d
+
+    def matching_ids(self, field_filters, tokens, start_us, end_us, limit):
+        """Up to `limit` doc ids matching every filter, newest first"""
+        lo, hi = self.doc_range(start_us, end_us)
+        if lo >= hi:
+            return []
+        filters = self._filters(field_filters, tokens, lo, hi)
+        if filters is None:
+            return []
+        bitmap_bytes, postings = filters
+
+        if postings:
+            ids = []
+            for d in self._walk_postings(bitmap_bytes, postings, lo, hi):
+                ids.append(d)
+                if len(ids) >= limit:
+                    break
+            return ids
+
+        # Walk the bitmap backwards in small windows so only the newest matches are decoded
+        ids = []
+        window = 512
+        end = len(bitmap_bytes)
+        while end > 0 and len(ids) < limit:
+            begin = max(0, end - window)
+            chunk = int.from_bytes(bitmap_bytes[begin:end], 'little')
+            while chunk and len(ids) < limit:
+                bit = chunk.bit_length() - 1
+                ids.append(begin * 8 + bit)
+                chunk ^= 1 << bit
+            end = begin
+        return ids
+
+    def count(self, field_filters, start_us, end_us):
+        lo, hi = self.doc_range(start_us, end_us)
+        if lo >= hi:
+            return 0
+        filters = self._filters(field_filters, [], lo, hi)
+        if filters is None:
+            return 0
+        bitmap_bytes, postings = filters
+        if postings:
+            return sum(1 for _ in self._walk_postings(bitmap_bytes, postings, lo, hi))
+        return int.from_bytes(bitmap_bytes, 'little').bit_count()
+
+    def all_docs(self):
+        for doc_id in range(self.doc_count):
+            yield self.timestamps[doc_id], self.doc(doc_id)
+
+
+def write_segment(path, docs, presorted=False):
+    """Write (timestamp_us, doc) pairs as an immutable segment directory, atomically.
+
+    With `presorted` the pairs are streamed straight to disk, so an iterator
+    already in timestamp order is never held in memory.
+    """
+    if not presorted:
+        docs = sorted(docs, key=lambda item: item[0])
+    tmp_path = path + '.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    doc_count = 0
+    timestamps = array('q')
+    doc_offsets = array('Q', [0])
+    field_ids = {field: {} for field in BITMAP_FIELDS}
+    term_ids = {}
+
+    with open(os.path.join(tmp_path, 'docs.bin'), 'wb') as f:
+        for doc_id, (ts, doc) in enumerate(docs):
+            encoded = json.dumps(doc, separators=(',', ':')).encode('utf-8')
+            f.write(encoded)
+            timestamps.append(ts)
+            doc_offsets.append(doc_offsets[-1] + len(encoded))
+            doc_count += 1
+            for field in BITMAP_FIELDS:
+                value = doc.get(field)
+                if value is not None:
+                    field_ids[field].setdefault(str(value), array('I')).append(doc_id)
+            for token in tokenize(str(doc.get('message', ''))):
+                term_ids.setdefault(token, array('I')).append(doc_id)
+
+    with open(os.path.join(tmp_path, 'ts.bin'), 'wb') as f:
+        timestamps.tofile(f)
+    with open(os.path.join(tmp_path, 'docs.idx'), 'wb') as f:
+        doc_offsets.tofile(f)
+
+    bitmap_length = (doc_count + 7) // 8
+    fields = {}
+    with open(os.path.join(tmp_path, 'bitmaps.bin'), 'wb') as bitmaps_file, \
+            open(os.path.join(tmp_path, 'field_postings.bin'), 'wb') as postings_file:
+        offset = 0
+        posting_offset = 0
+        for field, values in field_ids.items():
+            fields[field] = {}
+            for value, ids in values.items():
+                # High-cardinality fields like node_id and template_id are mostly rare values
+                if len(ids) * ids.itemsize < bitmap_length:
+                    ids.tofile(postings_file)
+                    fields[field][value] = [posting_offset, len(ids), 'ids']
+                    posting_offset += len(ids)
+                    continue
+                bitmaps_file.write(_ids_to_bits(ids, bitmap_length).to_bytes(bitmap_length, 'little'))
+                fields[field][value] = [offset, bitmap_length]
+                offset += bitmap_length
+
+    term_offsets = array('Q', [0])
+    posting_offsets = array('Q', [0])
+    with open(os.path.join(tmp_path, 'terms.bin'), 'wb') as terms_file, \
+            open(os.path.join(tmp_path, 'postings.bin'), 'wb') as postings_file:
+        for term in sorted(term_ids, key=lambda t: t.encode('utf-8')):
+            encoded = term.encode('utf-8')
+            terms_file.write(encoded)
+            term_offsets.append(term_offsets[-1] + len(encoded))
+            term_ids[term].tofile(postings_file)
+            posting_offsets.append(posting_offsets[-1] + len(term_ids[term]))
+    with open(os.path.join(tmp_path, 'terms.idx'), 'wb') as f:
+        term_offsets.tofile(f)
+    with open(os.path.join(tmp_path, 'postings.idx'), 'wb') as f:
+        posting_offsets.tofile(f)
+
+    meta = {
+        'doc_count': doc_count,
+        'min_ts': timestamps[0] if doc_count else 0,
+        'max_ts': timestamps[-1] if doc_count else 0,
+        'fields': fields,
+    }
+    with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+    os.rename(tmp_path, path)
+    return Segment(path)
+
+
+class LocalLogIndex:
+    """Embedded log index: an in-memory buffer plus immutable mmap'd segments"""
+
+    def __init__(self, base_dir):
+        self.base_dir = base_dir
+        os.makedirs(base_dir, exist_ok=True)
+        self.buffer = []
+        self.buffer_lock = threading.Lock()
+        self.segments_lock = threading.Lock()
+        self.merge_lock = threading.Lock()
+        self.is_running = False
+        self.next_generation = 0
+        self.segments = self._load_manifest()
+
+    def _manifest_path(self):
+        return os.path.join(self.base_dir, 'segments.json')
+
+    def _load_manifest(self):
+        names = []
+        if os.path.exists(self._manifest_path()):
+            with open(self._manifest_path()) as f:
+                names = json.load(f)
+        # Anything on disk but not in the manifest is left over from an interrupted flush or merge
+        for entry in os.listdir(self.base_dir):
+            if entry.startswith('seg-') and entry not in names:
+                shutil.rmtree(os.path.join(self.base_dir, entry), ignore_errors=True)
+        if names:
+            self.next_generation = max(int(name.split('-')[1]) for name in names) + 1
+        return [Segment(os.path.join(self.base_dir, name)) for name in names]
+
+    def _write_manifest(self, segments):
+        tmp_path = self._manifest_path() + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump([segment.name for segment in segments], f)
+        os.replace(tmp_path, self._manifest_path())
+
+    def _new_segment_path(self):
+        with self.segments_lock:
+            generation = self.next_generation
+            self.next_generation += 1
+        return os.path.join(self.base_dir, f"seg-{generation:010d}")
+
+    def add(self, log_data):
+        with self.buffer_lock:
+            self.buffer.append((to_micros(log_data.get('timestamp')), log_data))
+            if len(self.buffer) < SEGMENT_MAX_DOCS:
+                return
+        self.flush()
+
+    def flush(self):
+        """Turn the in-memory buffer into a new segment"""
+        with self.buffer_lock:
+            docs, self.buffer = self.buffer, []
+        if not docs:
+            return
+        segment = write_segment(self._new_segment_path(), docs)
+        with self.segments_lock:
+            self.segments = self.segments + [segment]
+            self._write_manifest(self.segments)
+
+    def merge(self):
+        """Merge the smallest segments into one once there are too many"""
+        with self.merge_lock:
+            with self.segments_lock:
+                candidates = [s for s in self.segments if s.doc_count < MERGE_MAX_DOCS]
+            if len(candidates) <= MERGE_MAX_SEGMENTS:
+                return
+            # Take the smallest segments, stopping before the merged one would pass MERGE_MAX_DOCS
+            chosen = []
+            total = 0
+            for segment in sorted(candidates, key=lambda s: s.doc_count)[:MERGE_MAX_SEGMENTS]:
+                if total + segment.doc_count > MERGE_MAX_DOCS:
+                    break
+                chosen.append(segment)
+                total += segment.doc_count
+            if len(chosen) < 2:
+                return
+            candidates = chosen
+            merged_docs = heapq.merge(*(s.all_docs() for s in candidates), key=lambda item: item[0])
+            merged = write_segment(self._new_segment_path(), merged_docs, presorted=True)
+            merged_names = {s.name for s in candidates}
+            with self.segments_lock:
+                self.segments = [s for s in self.segments if s.name not in merged_names] + [merged]
+                self._write_manifest(self.segments)
+            # Open mmaps stay valid after unlinking, so in-flight queries are unaffected
+            for segment in candidates:
+                shutil.rmtree(segment.path, ignore_errors=True)
+
+    def search(self, query=None, log_level=None, service_name=None, node_id=None,
+               message_type=None, template_id=None, start=None, end=None, limit=100):
+        """Return up to `limit` matching logs, newest first.
+
+        Field filters take a value or a list of values, `query` is matched
+        against message tokens, and `start`/`end` bound the timestamp.
+        """
+        field_filters = _field_filters(log_level, service_name, node_id, message_type, template_id)
+        tokens = sorted(tokenize(query)) if query else []
+        start_us = to_micros(start) if start is not None else None
+        end_us = to_micros(end) if end is not None else None
+
+        with self.buffer_lock:
+            buffered = list(self.buffer)
+        results = [(ts, doc) for ts, doc in buffered
+                   if self._matches(doc, ts, field_filters, tokens, start_us, end_us)]
+
+        with self.segments_lock:
+            segments = list(self.segments)
+        for segment in sorted(segments, key=lambda s: s.max_ts, reverse=True):
+            if start_us is not None and segment.max_ts < start_us:
+                continue
+            if end_us is not None and segment.min_ts >= end_us:
+                continue
+            # Segments are visited newest-first, so an older segment cannot displace a full result set
+            if len(results) >= limit and segment.max_ts < heapq.nlargest(limit, (ts for ts, _ in results))[-1]:
+                continue
+            for doc_id in segment.matching_ids(field_filters, tokens, start_us, end_us, limit):
+                results.append((segment.timestamps[doc_id], segment.doc(doc_id)))
+
+        results.sort(key=lambda item: item[0], reverse=True)
+        return [doc for _, doc in results[:limit]]
+
+    def count(self, log_level=None, service_name=None, node_id=None, message_type=None,
+              template_id=None, start=None, end=None):
+        """Count matching logs using only the field bitmaps"""
+        field_filters = _field_filters(log_level, service_name, node_id, message_type, template_id)
+        start_us = to_micros(start) if start is not None else None
+        end_us = to_micros(end) if end is not None else None
+
+        with self.buffer_lock:
+            buffered = list(self.buffer)
+        total = sum(1 for ts, doc in buffered if self._matches(doc, ts, field_filters, [], start_us, end_us))
+        with self.segments_lock:
+            segments = list(self.segments)
+        return total + sum(segment.count(field_filters, start_us, end_us) for segment in segments)
+
+    @staticmethod
+    def _matches(doc, ts, field_filters, tokens, start_us, end_us):
+        if start_us is not None and ts < start_us:
+            return False
+        if end_us is not None and ts >= end_us:
+            return False
+        for field, values in field_filters.items():
+            if str(doc.get(field)) not in values:
+                return False
+        if tokens:
+            doc_tokens = tokenize(str(doc.get('message', '')))
+            return all(token in doc_tokens for token in tokens)
+        return True
+
+    def _maintenance_loop(self):
+        last_flush = time.time()
+        while self.is_running:
+            time.sleep(1)
+            try:
+                if time.time() - last_flush >= SEGMENT_FLUSH_INTERVAL:
+                    self.flush()
+                    last_flush = time.time()
+                self.merge()
+            except Exception as e:
+                print(f"Local index maintenance error: {e}")
+
+    def start(self):
+        self.is_running = True
+        maintenance = threading.Thread(target=self._maintenance_loop)
+        maintenance.daemon = True
+        maintenance.start()
+
+    def close(self):
+        self.is_running = False
+        self.flush()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query a local log index")
+    parser.add_argument('index_dir', help="e.g. local_index/alert_logs")
+    parser.add_argument('query', nargs='*', help="words that must appear in the message")
+    parser.add_argument('--level')
+    parser.add_argument('--service')
+    parser.add_argument('--node')
+    parser.add_argument('--template')
+    parser.add_argument('--since', type=int, default=3600, help="seconds to look back")
+    parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+
+    index = LocalLogIndex(args.index_dir)
+    started = time.perf_counter()
+    logs = index.search(
+        query=' '.join(args.query),
+        log_level=args.level,
+        service_name=args.service,
+        node_id=args.node,
+        template_id=args.template,
+        start=datetime.now(pytz.UTC) - timedelta(seconds=args.since),
+        limit=args.limit,
+    )
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    for log in logs:
+        print(f"{log.get('timestamp')} - {log.get('node_id')} - {log.get('message')}")
+    print(f"{len(logs)} logs in {elapsed_ms:.1f} ms")
@@ -0,0 +1,116 @@
+import fcntl
+import hashlib
+import itertools
+import os
+import tempfile
+import threading
+import time
+
+# 64-bit layout: 1 unused sign bit | 41 bits milliseconds | 10 bits node | 4 bits thread | 8 bits sequence
+EPOCH_MS = 1704067200000  # 2024-01-01T00:00:00Z
+NODE_BITS = 10
+THREAD_BITS = 4
+SEQUENCE_BITS = 8
+
+THREAD_SHIFT = SEQUENCE_BITS
+NODE_SHIFT = THREAD_BITS + SEQUENCE_BITS
+TIMESTAMP_SHIFT = NODE_BITS + THREAD_BITS + SEQUENCE_BITS
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+NODE_LOCK_DIR = os.path.join(tempfile.gettempdir(), 'log_id_nodes')  # lock files of the node numbers claimed on this host
+
+_claimed_nodes = {}  # node number -> open lock file, held for the life of the process
+_claim_lock = threading.Lock()
+
+
+def node_component(node_key, lock_dir=None):
+    """10-bit node number, from LOG_ID_NODE if set, otherwise one claimed on this host.
+
+    Without LOG_ID_NODE, each process takes an exclusive lock on a node
+    number's lock file, starting from a hash of the node key. Two processes
+    on the same host therefore never share a number. Processes on different
+    hosts can still collide, so multi-host deployments must set LOG_ID_NODE.
+    """
+    if os.environ.get('LOG_ID_NODE'):
+        node = int(os.environ['LOG_ID_NODE'])
+        if not 0 <= node < (1 << NODE_BITS):
+            raise ValueError(f"LOG_ID_NODE must be between 0 and {(1 << NODE_BITS) - 1}, got {node}")
+        return node
+    lock_dir = lock_dir or NODE_LOCK_DIR
+    os.makedirs(lock_dir, exist_ok=True)
+    digest = hashlib.blake2b(node_key.encode('utf-8'), digest_size=4).digest()
+    first = int.from_bytes(digest, 'big')
+    with _claim_lock:
+        for offset in range(1 << NODE_BITS):
+            node = (first + offset) & ((1 << NODE_BITS) - 1)
+            if node in _claimed_nodes:
+                continue
+            lock_file = open(os.path.join(lock_dir, f"{node}.lock"), 'a')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock_file.close()
+                continue
+            _claimed_nodes[node] = lock_file
+            print(f"WARNING: LOG_ID_NODE is not set; claimed log id node {node}, which is only unique on this host")
+            return node
+    raise RuntimeError(f"all {1 << NODE_BITS} log id node numbers are in use on this host; set LOG_ID_NODE")
+
+
+class _Slot:
+    __slots__ = ('number', 'lock', 'last_ms', 'sequence')
+
+    def __init__(self, number):
+        self.number = number
+        self.lock = threading.Lock()
+        self.last_ms = 0
+        self.sequence = 0
+
+
+class SnowflakeGenerator:
+    """Time-ordered 64-bit log ids that are unique across threads, nodes and restarts.
+
+    Threads are spread over the 16 thread slots, each with its own sequence.
+    The first 16 threads have a slot to themselves, so its lock is never
+    contended; later threads share a slot and its sequence. If a slot uses up
+    its sequence within one millisecond, it borrows the next millisecond
+    instead of waiting.
+    """
+
+    def __init__(self, node_key, lock_dir=None):
+        self.node = node_component(node_key, lock_dir)
+        self.slots = [_Slot(number) for number in range(1 << THREAD_BITS)]
+        self.thread_slots = itertools.count()
+        self.local = threading.local()
+
+    def next_id(self):
+        slot = getattr(self.local, 'slot', None)
+        if slot is None:
+            # next() on itertools.count is atomic under the GIL
+            slot = self.local.slot = self.slots[next(self.thread_slots) % len(self.slots)]
+        with slot.lock:
+            now_ms = int(time.time() * 1000) - EPOCH_MS
+            if now_ms > slot.last_ms:
+                slot.last_ms = now_ms
+                slot.sequence = 0
+            elif slot.sequence < MAX_SEQUENCE:
+                # Same millisecond, or the clock stepped back: keep counting from the last timestamp
+                slot.sequence += 1
+            else:
+                slot.last_ms += 1
+                slot.sequence = 0
+            last_ms, sequence = slot.last_ms, slot.sequence
+        return (
+            (last_ms << TIMESTAMP_SHIFT)
+            | (self.node << NODE_SHIFT)
+            | (slot.number << THREAD_SHIFT)
+            | sequence
+        )
+
+    def next_log_id(self):
+        """Zero-padded decimal form, so string order matches time order"""
+        return f"{self.next_id():019d}"
+
+
+def id_timestamp_ms(log_id):
+    """Unix epoch milliseconds encoded in a log id"""
+    return (int(log_id) >> TIMESTAMP_SHIFT) + EPOCH_MS
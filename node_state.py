@@ -0,0 +1,104 @@
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+NODE_STATE_INDEX = 'node_state'
+NODE_STATE_REFRESH_SECONDS = 300   # re-upsert an unchanged node this often so last_seen stays current
+HEARTBEAT_SAMPLE_SECONDS = 600     # keep one raw heartbeat per node this often; 0 keeps every heartbeat
+
+
+def timestamp_version(timestamp):
+    """Microseconds since the epoch, used as an external version so older states never win"""
+    try:
+        return int(datetime.fromisoformat(timestamp).timestamp() * 1000000)
+    except (TypeError, ValueError):
+        return None
+
+
+class NodeStateTable:
+    """Current status per node_id, built from HEARTBEAT and REGISTRATION records.
+
+    `observe` returns the state document to upsert (only when a node's status
+    changes, it registers, or its last upsert is older than the refresh
+    interval) and whether the raw record should still be indexed. Registration
+    records are always kept; heartbeats are sampled once per node per
+    `heartbeat_sample_seconds` unless they carry a status change.
+    """
+
+    def __init__(self, refresh_seconds=NODE_STATE_REFRESH_SECONDS,
+                 heartbeat_sample_seconds=HEARTBEAT_SAMPLE_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self.heartbeat_sample_seconds = heartbeat_sample_seconds
+        self.nodes = {}
+        self.last_upsert = {}
+        self.last_raw_heartbeat = {}
+        self.dirty = False
+
+    def observe(self, log_data):
+        message_type = log_data.get('message_type')
+        node_id = log_data.get('node_id')
+        if message_type not in ('HEARTBEAT', 'REGISTRATION') or not node_id:
+            return None, True
+        timestamp = log_data.get('timestamp', '')
+        state = self.nodes.get(node_id)
+        if state is not None and timestamp < state['last_seen']:
+            # Redelivered or late record; the table already holds something newer
+            return None, message_type == 'REGISTRATION'
+
+        status = log_data.get('status')
+        changed = state is None or state['status'] != status
+        if state is None:
+            state = self.nodes[node_id] = {'node_id': node_id}
+        if changed:
+            state['status_since'] = timestamp
+        # Heartbeats carry no service_name, so keep the one from registration
+        state['service_name'] = log_data.get('service_name') or state.get('service_name')
+        state['status'] = status
+        state['last_seen'] = timestamp
+        if message_type == 'HEARTBEAT':
+            state['last_heartbeat'] = timestamp
+        else:
+            state['last_registration'] = timestamp
+        self.dirty = True
+
+        now = time.time()
+        upsert = None
+        if changed or message_type == 'REGISTRATION' or \
+                now - self.last_upsert.get(node_id, 0) >= self.refresh_seconds:
+            self.last_upsert[node_id] = now
+            upsert = dict(state)
+
+        if message_type == 'REGISTRATION':
+            return upsert, True
+        keep_raw = changed or now - self.last_raw_heartbeat.get(node_id, 0) >= self.heartbeat_sample_seconds
+        if keep_raw:
+            self.last_raw_heartbeat[node_id] = now
+        return upsert, keep_raw
+
+    def snapshot(self):
+        return sorted(self.nodes.values(), key=lambda state: state['node_id'])
+
+    def save(self, path):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(tmp_path, path)
+        self.dirty = False
+
+    def load(self, path):
+        if not os.path.exists(path):
+            return
+        with open(path) as f:
+            for state in json.load(f):
+                self.nodes[state['node_id']] = state
+
+
+if __name__ == "__main__":
+    # Print a saved state table: python node_state.py node_state.json
+    table = NodeStateTable()
+    table.load(sys.argv[1] if len(sys.argv) > 1 else 'node_state.json')
+    for state in table.snapshot():
+        print(f"{state['node_id']:<40} {state.get('service_name') or '':<28} {state.get('status') or '':<6} "
+              f"since {state.get('status_since', '')}  last seen {state['last_seen']}")
@@ -0,0 +1,450 @@
+import argparse
+import json
+import multiprocessing
+import queue
+import struct
+import threading
+import time
+from datetime import datetime
+from multiprocessing import shared_memory
+
+from dedup import get_document_id
+from validation import InvalidRecord, validate_record
+
+PIPELINE_WORKERS = 4
+PIPELINE_SLOTS = 16                      # batches in flight between the fetcher and the workers
+PIPELINE_SLOT_BYTES = 4 * 1024 * 1024    # raw message bytes per batch
+PIPELINE_MAX_BATCH = 5000                # records per batch
+ACTION_LINE_BYTES = 160                  # room per record for the bulk action line in the result slot
+REJECT_REASON_CHARS = 300                # reject reasons are cut to this length before crossing back
+
+COUNT = struct.Struct('<I')
+RESULT_HEADER = struct.Struct('<III')    # body bytes, reject bytes, records in body
+
+
+class SharedBatchRing:
+    """Fixed slots of shared memory for raw batches and the bulk bodies built from them.
+
+    An input slot holds a record count, the length of every record and the
+    records back to back; the matching result slot holds the bulk body and
+    the rejected records. Only slot numbers travel through queues, so batches
+    cross process boundaries without being pickled.
+    """
+
+    def __init__(self, slots=PIPELINE_SLOTS, slot_bytes=PIPELINE_SLOT_BYTES, names=None):
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.result_bytes = slot_bytes + PIPELINE_MAX_BATCH * ACTION_LINE_BYTES + RESULT_HEADER.size
+        self.owner = names is None
+        if self.owner:
+            self.inputs = shared_memory.SharedMemory(create=True, size=slots * slot_bytes)
+            self.results = shared_memory.SharedMemory(create=True, size=slots * self.result_bytes)
+        else:
+            self.inputs = shared_memory.SharedMemory(name=names[0])
+            self.results = shared_memory.SharedMemory(name=names[1])
+
+    @property
+    def names(self):
+        return self.inputs.name, self.results.name
+
+    def write_batch(self, slot, values):
+        """Copy as many values as fit into an input slot; returns how many were written"""
+        base = slot * self.slot_bytes
+        limit = base + self.slot_bytes
+        count = min(len(values), PIPELINE_MAX_BATCH)
+        payload = base + COUNT.size + 4 * count
+        fitted = 0
+        for value in values[:count]:
+            if payload + len(value) > limit:
+                break
+            fitted += 1
+            payload += len(value)
+        if fitted == 0 and values:
+            raise ValueError(f"record of {len(values[0])} bytes does not fit in a {self.slot_bytes} byte slot")
+        buf = self.inputs.buf
+        COUNT.pack_into(buf, base, fitted)
+        lengths = [len(value) for value in values[:fitted]]
+        struct.pack_into(f'<{fitted}I', buf, base + COUNT.size, *lengths)
+        position = base + COUNT.size + 4 * fitted
+        for value in values[:fitted]:
+            buf[position:position + len(value)] = value
+            position += len(value)
+        return fitted
+
+    def read_batch(self, slot):
+        base = slot * self.slot_bytes
+        buf = self.inputs.buf
+        count = COUNT.unpack_from(buf, base)[0]
+        lengths = struct.unpack_from(f'<{count}I', buf, base + COUNT.size)
+        position = base + COUNT.size + 4 * count
+        values = []
+        for length in lengths:
+            values.append(bytes(buf[position:position + length]))
+            position += length
+        return values
+
+    def write_result(self, slot, body, rejects, records):
+        if RESULT_HEADER.size + len(body) + len(rejects) > self.result_bytes:
+            # Re-encoding (escapes, added timestamps) can outgrow the input; never spill into the next slot
+            raise ValueError(f"batch result of {len(body) + len(rejects)} bytes does not fit in a "
+                             f"{self.result_bytes} byte result slot")
+        base = slot * self.result_bytes
+        RESULT_HEADER.pack_into(self.results.buf, base, len(body), len(rejects), records)
+        start = base + RESULT_HEADER.size
+        self.results.buf[start:start + len(body)] = body
+        self.results.buf[start + len(body):start + len(body) + len(rejects)] = rejects
+
+    def read_result(self, slot):
+        """Return (bulk body, [(index in batch, code, reason)], records in body)"""
+        base = slot * self.result_bytes
+        body_length, rejects_length, records = RESULT_HEADER.unpack_from(self.results.buf, base)
+        start = base + RESULT_HEADER.size
+        body = bytes(self.results.buf[start:start + body_length])
+        rejects = json.loads(bytes(self.results.buf[start + body_length:start + body_length + rejects_length]))
+        return body, rejects, records
+
+    def close(self):
+        self.inputs.close()
+        self.results.close()
+        if self.owner:
+            self.inputs.unlink()
+            self.results.unlink()
+
+
+def build_bulk_body(values, route):
+    """Decode and validate raw records and build one NDJSON bulk body of create actions.
+
+    A record that needs no changes is copied into the body as it arrived
+    instead of being serialized again.
+    """
+    lines = []
+    rejects = []
+    for position, raw in enumerate(values):
+        try:
+            log_data = json.loads(raw)
+            if not isinstance(log_data, dict):
+                raise InvalidRecord('not_an_object', f"expected a JSON object, got {type(log_data).__name__}")
+            validate_record(log_data)
+        except InvalidRecord as e:
+            rejects.append((position, e.code, str(e)[:REJECT_REASON_CHARS]))
+            continue
+        except (UnicodeDecodeError, ValueError) as e:
+            rejects.append((position, 'undecodable', f"not valid JSON: {e}"[:REJECT_REASON_CHARS]))
+            continue
+        doc_id = get_document_id(log_data)
+        if 'timestamp' not in log_data:
+            log_data['timestamp'] = datetime.utcnow().isoformat()
+            raw = json.dumps(log_data).encode('utf-8')
+        elif b'\n' in raw:
+            raw = json.dumps(log_data).encode('utf-8')
+        lines.append(b'{"create":{"_index":"%s","_id":%s}}\n' % (
+            route(log_data).encode('utf-8'), json.dumps(doc_id).encode('utf-8')))
+        lines.append(raw.rstrip(b'\r') + b'\n')
+    return b''.join(lines), json.dumps(rejects).encode('utf-8'), len(lines) // 2
+
+
+def bulk_lines(body):
+    """The lines of an NDJSON bulk body, each with its newline.
+
+    Split on \\n alone: documents copied through unchanged may contain \\r as
+    JSON whitespace, which bytes.splitlines would also treat as a line end.
+    """
+    return [line + b'\n' for line in body.split(b'\n')[:-1]]
+
+
+def default_route(log_data):
+    from consumer_es import get_elasticsearch_index
+    return get_elasticsearch_index(log_data)
+
+
+def _worker(ring_names, slots, slot_bytes, tasks, done, route):
+    ring = SharedBatchRing(slots, slot_bytes, names=ring_names)
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                return
+            slot, seq = task
+            try:
+                body, rejects, records = build_bulk_body(ring.read_batch(slot), route)
+                ring.write_result(slot, body, rejects, records)
+                error = None
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            done.put((slot, seq, error))
+    finally:
+        ring.close()
+
+
+class PipelineError(RuntimeError):
+    pass
+
+
+class ParallelPipeline:
+    """Fetcher-side driver of the worker pool.
+
+    `submit` copies a batch into a free slot and hands its number to a worker.
+    A collector thread takes finished batches back in submission order and
+    calls `deliver(body, records, rejects, batch)` for each. Because batches
+    are delivered strictly in order, offsets can be committed as each one
+    completes. The first batch that fails stops delivery of it and of every
+    later batch, and the error is raised to the caller. A worker that dies is
+    detected the same way. Slots are only recycled after delivery, so a slow
+    index holds the fetcher back instead of filling memory.
+    """
+
+    def __init__(self, deliver, workers=PIPELINE_WORKERS, slots=PIPELINE_SLOTS,
+                 slot_bytes=PIPELINE_SLOT_BYTES, route=default_route):
+        self.deliver = deliver
+        self.ring = SharedBatchRing(slots, slot_bytes)
+        self.free_slots = queue.Queue()
+        for slot in range(slots):
+            self.free_slots.put(slot)
+        self.tasks = multiprocessing.Queue()
+        self.done = multiprocessing.Queue()
+        self.batches = {}
+        self.next_seq = 0
+        self.error = None
+        self.closed = False
+        self.processes = [
+            multiprocessing.Process(target=_worker, args=(self.ring.names, slots, slot_bytes, self.tasks, self.done, route),
+                                    name=f"pipeline-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for process in self.processes:
+            process.start()
+        self.collector = threading.Thread(target=self._collect, name='pipeline-collector', daemon=True)
+        self.collector.start()
+
+    def submit(self, values, batch=None):
+        """Queue raw records; `batch` (anything, e.g. the Kafka messages) comes back with the result.
+
+        Returns the (values, batch) tail that did not fit in one slot, or None.
+        """
+        while True:
+            self.raise_if_failed()
+            try:
+                slot = self.free_slots.get(timeout=0.1)
+                break
+            except queue.Empty:
+                pass
+        fitted = self.ring.write_batch(slot, values)
+        seq = self.next_seq
+        self.next_seq += 1
+        head = batch[:fitted] if batch is not None else None
+        self.batches[seq] = (slot, head)
+        self.tasks.put((slot, seq))
+        if fitted < len(values):
+            return values[fitted:], batch[fitted:] if batch is not None else None
+        return None
+
+    def submit_all(self, values, batch=None):
+        rest = (values, batch)
+        while rest and rest[0]:
+            rest = self.submit(*rest)
+
+    def _collect(self):
+        finished = {}
+        expected = 0
+        while True:
+            item = self.done.get()
+            if item is None:
+                return
+            slot, seq, error = item
+            finished[seq] = (slot, error)
+            while expected in finished:
+                slot, error = finished.pop(expected)
+                _, batch = self.batches.pop(expected)
+                if self.error is None:
+                    try:
+                        if error:
+                            raise PipelineError(f"batch {expected} failed in a worker: {error}")
+                        body, rejects, records = self.ring.read_result(slot)
+                        self.deliver(body, records, rejects, batch)
+                    except Exception as e:
+                        # Nothing after a failed batch is delivered, so no offset past it is committed
+                        self.error = e
+                self.free_slots.put(slot)
+                expected += 1
+
+    def raise_if_failed(self):
+        if self.error is None:
+            for process in self.processes:
+                if not process.is_alive():
+                    # Its batch will never come back, so nothing after it can be delivered
+                    self.error = PipelineError(f"{process.name} exited with code {process.exitcode}")
+                    break
+        if self.error is not None:
+            raise self.error
+
+    def drain(self):
+        """Wait until every submitted batch has been delivered"""
+        while self.batches:
+            self.raise_if_failed()
+            time.sleep(0.001)
+        self.raise_if_failed()
+
+    def close(self):
+        """Deliver what is in flight and stop the workers; raises if a batch failed"""
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.drain()
+        finally:
+            for _ in self.processes:
+                self.tasks.put(None)
+            for process in self.processes:
+                process.join(timeout=5)
+                if process.is_alive():
+                    process.terminate()
+                    process.join()
+            self.done.put(None)
+            self.collector.join()
+            self.ring.close()
+
+
+def benchmark(records=1000000, worker_counts=(1, 2, 4), batch=PIPELINE_MAX_BATCH):
+    """Records per second through the pipeline (decode, validate, bulk body) for each worker count"""
+    from synthetic_logs import SyntheticLogGenerator
+
+    lines = []
+    generator = SyntheticLogGenerator(seed=1)
+    for _, blocks in generator.chunks(records):
+        for block in blocks:
+            lines.extend(block.tobytes().splitlines())
+
+    results = {}
+    route = _benchmark_route
+    started = time.perf_counter()
+    build_bulk_body(lines, route)
+    results['in process'] = records / (time.perf_counter() - started)
+    for workers in worker_counts:
+        delivered = [0]
+
+        def deliver(body, count, rejects, _):
+            delivered[0] += count + len(rejects)
+
+        pipeline = ParallelPipeline(deliver, workers=workers, route=route)
+        started = time.perf_counter()
+        for start in range(0, len(lines), batch):
+            pipeline.submit_all(lines[start:start + batch])
+        pipeline.close()
+        results[f"{workers} workers"] = delivered[0] / (time.perf_counter() - started)
+    return results
+
+
+def _benchmark_route(log_data):
+    return 'service_logs'
+
+
+def run_consumer(workers):
+    """Consume every log topic through the worker pool and bulk-index the bodies it builds"""
+    from kafka import TopicPartition
+    from elasticsearch import ApiError, TransportError
+    from bulk_indexer import is_retryable_status
+    from consumer_es import (ALERT_LANE_TOPICS, BULK_LANE_TOPICS, POLL_TIMEOUT_MS, MAX_POLL_RECORDS,
+                             FETCH_MIN_BYTES, FETCH_MAX_WAIT_MS, create_kafka_consumer, dead_letters,
+                             es_connection)
+
+    consumer = create_kafka_consumer(ALERT_LANE_TOPICS + BULK_LANE_TOPICS, MAX_POLL_RECORDS,
+                                     FETCH_MIN_BYTES, FETCH_MAX_WAIT_MS)
+    committable = {}
+    commit_lock = threading.Lock()
+    stats = {'indexed': 0, 'duplicates': 0, 'dead_lettered': 0, 'rejected': 0}
+
+    def send(body):
+        delay = 0.5
+        while True:
+            es = es_connection.wait_ready()
+            try:
+                return es.bulk(operations=body)
+            except ApiError as e:
+                if not is_retryable_status(e.status_code):
+                    raise
+            except TransportError as e:
+                es_connection.mark_failed(e)
+            time.sleep(delay)
+            delay = min(30, delay * 2)
+
+    def deliver(body, records, rejects, messages):
+        # Runs on the collector thread, one batch at a time and in fetch order
+        while body:
+            response = send(body)
+            lines = bulk_lines(body)
+            retry = []
+            for position, item in enumerate(response['items']):
+                result = item.get('create', {})
+                status = result.get('status', 0)
+                if is_retryable_status(status):
+                    retry.extend(lines[2 * position:2 * position + 2])
+                elif status == 409:
+                    stats['duplicates'] += 1
+                elif status >= 300:
+                    stats['dead_lettered'] += 1
+                    dead_letters.reject_document(result.get('_index'), result.get('_id'),
+                                                 json.loads(lines[2 * position + 1]), f"index_{status}",
+                                                 json.dumps(result.get('error'), default=str))
+                else:
+                    stats['indexed'] += 1
+            body = b''.join(retry)
+            if body:
+                time.sleep(0.5)
+        for position, code, reason in rejects:
+            stats['rejected'] += 1
+            dead_letters.reject(messages[position], code, reason)
+        with commit_lock:
+            for message in messages:
+                committable[TopicPartition(message.topic, message.partition)] = message.offset + 1
+
+    pipeline = ParallelPipeline(deliver, workers=workers)
+    print(f"Pipeline consumer running with {workers} workers")
+    try:
+        while True:
+            records = consumer.poll(timeout_ms=POLL_TIMEOUT_MS)
+            messages = [message for batch in records.values() for message in batch]
+            if messages:
+                pipeline.submit_all([message.value for message in messages], messages)
+            else:
+                pipeline.raise_if_failed()
+            with commit_lock:
+                offsets = dict(committable)
+                committable.clear()
+            if offsets:
+                # KafkaConsumer is not thread-safe, so commits happen here on the polling thread
+                consumer.commit_async({tp: _offset_and_metadata(offset) for tp, offset in offsets.items()})
+    except KeyboardInterrupt:
+        print(f"\nPipeline stopped: {stats}")
+    finally:
+        try:
+            pipeline.close()
+        except Exception as e:
+            # Offsets stop before the failed batch, so it is consumed again on restart
+            print(f"Pipeline stopped at a failed batch: {e}")
+        with commit_lock:
+            offsets = dict(committable)
+        if offsets:
+            consumer.commit({tp: _offset_and_metadata(offset) for tp, offset in offsets.items()})
+        consumer.close()
+        dead_letters.close()
+        es_connection.close()
+
+
+def _offset_and_metadata(offset):
+    from kafka.structs import OffsetAndMetadata
+    return OffsetAndMetadata(offset, '', -1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multi-process decode and bulk-body pipeline")
+    parser.add_argument('--workers', type=int, default=PIPELINE_WORKERS)
+    parser.add_argument('--bench', type=int, metavar='RECORDS',
+                        help="measure throughput on synthetic records instead of consuming Kafka")
+    args = parser.parse_args()
+
+    if args.bench:
+        counts = sorted({1, 2, args.workers})
+        for label, rate in benchmark(args.bench, counts).items():
+            print(f"{label:<12} {rate:>12,.0f} records/s")
+    else:
+        run_consumer(args.workers)
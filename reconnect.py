@@ -0,0 +1,117 @@
+import random
+import socket
+import threading
+import time
+
+RECONNECT_BASE_SECONDS = 0.5
+RECONNECT_MAX_SECONDS = 30
+
+
+class LazyConnection:
+    """A network client that is created on first use and recreated in the background.
+
+    `connect` builds the client and `check` (optional) confirms the remote end
+    is reachable. Failed attempts are retried from a background thread with
+    capped, jittered exponential backoff, so callers never block on a dead
+    endpoint: `get()` returns None until the client is ready.
+    """
+
+    def __init__(self, name, connect, check=None):
+        self.name = name
+        self.connect = connect
+        self.check = check
+        self.client = None
+        self.is_ready = False
+        self.attempts = 0
+        self.last_error = None
+        self.next_attempt_at = 0
+        self.ready_event = threading.Event()
+        self.lock = threading.Lock()
+        self.reconnecting = False
+        self.closed = False
+
+    def get(self):
+        if self.is_ready:
+            return self.client
+        self._start_reconnect()
+        return None
+
+    def wait_ready(self, timeout=None):
+        """Block until the client is ready, returning it (or None on timeout)"""
+        self._start_reconnect()
+        self.ready_event.wait(timeout)
+        return self.client if self.is_ready else None
+
+    def mark_failed(self, error=None):
+        """Report a failed call; the client is rebuilt in the background"""
+        with self.lock:
+            if not self.is_ready:
+                return
+            self.is_ready = False
+            self.ready_event.clear()
+            self.last_error = error
+        print(f"{self.name} unavailable ({error}), reconnecting in the background")
+        self._start_reconnect()
+
+    def _start_reconnect(self):
+        with self.lock:
+            if self.reconnecting or self.is_ready or self.closed:
+                return
+            self.reconnecting = True
+        worker = threading.Thread(target=self._reconnect_loop, name=f"{self.name}-reconnect")
+        worker.daemon = True
+        worker.start()
+
+    def _attempt(self):
+        client = self.client if self.client is not None else self.connect()
+        try:
+            if self.check is not None and not self.check(client):
+                raise ConnectionError("health check failed")
+        except Exception:
+            # Keep a client that was built fine; only the remote end is down
+            self.client = client
+            raise
+        self.client = client
+
+    def _reconnect_loop(self):
+        while not self.closed:
+            try:
+                self._attempt()
+            except Exception as e:
+                self.attempts += 1
+                self.last_error = e
+                delay = min(RECONNECT_MAX_SECONDS, RECONNECT_BASE_SECONDS * (2 ** (self.attempts - 1)))
+                delay *= random.uniform(0.5, 1.5)
+                self.next_attempt_at = time.time() + delay
+                print(f"{self.name} not reachable ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            with self.lock:
+                self.is_ready = True
+                self.attempts = 0
+                self.last_error = None
+                self.reconnecting = False
+                self.ready_event.set()
+            print(f"{self.name} ready")
+            return
+        with self.lock:
+            self.reconnecting = False
+
+    def status(self):
+        return {
+            'ready': self.is_ready,
+            'attempts': self.attempts,
+            'last_error': str(self.last_error) if self.last_error else None,
+            'next_attempt_in': max(0.0, round(self.next_attempt_at - time.time(), 1)) if not self.is_ready else 0.0,
+        }
+
+    def close(self):
+        self.closed = True
+        if self.client is not None and hasattr(self.client, 'close'):
+            self.client.close()
+
+
+def tcp_reachable(host, port, timeout=1.0):
+    """Health check for endpoints without a ping of their own"""
+    with socket.create_connection((host, port), timeout=timeout):
+        return True
@@ -8,7 +8,11 @@ import pytz
 import sys
 import signal
 import socket
+from collections import deque
 from fluent import sender
+from log_ids import SnowflakeGenerator
+from instrumentation import instrumented, install_signal_handlers
+from reconnect import LazyConnection, tcp_reachable
 from colorama import init, Fore, Style
 
 init()
@@ -39,18 +43,39 @@ hostname = socket.gethostname()
 node_id = f"StockService_{hostname}"
 service_name = "StockTradingService"
 service_status = "UP"
-log_counter = 1
-fluent_sender = sender.FluentSender('services', host='localhost', port=24226)
+log_id_generator = SnowflakeGenerator(node_id)
+fluent_host = 'localhost'
+fluent_port = 24226
+fluent_connection = LazyConnection(
+    'Fluentd',
+    lambda: sender.FluentSender('services', host=fluent_host, port=fluent_port),
+    lambda client: tcp_reachable(fluent_host, fluent_port)
+)
+unsent_logs = deque(maxlen=10000)  # held while Fluentd is unreachable; oldest dropped when full
+unsent_lock = threading.Lock()
 
-def generate_log_id(service_name):
-    global log_counter
-    log_id = f"{service_name}_{log_counter}"
-    log_counter += 1  # Increment the counter
-    return log_id
+def generate_log_id():
+    return log_id_generator.next_log_id()
 
 def get_iso_timestamp():
     return datetime.now(pytz.UTC).isoformat()
 
+@instrumented('fluent_emit')
+def emit_log(tag, log_data):
+    with unsent_lock:
+        unsent_logs.append((tag, log_data))
+        fluent_sender = fluent_connection.get()
+        if fluent_sender is None:
+            return
+        # Send oldest first, including anything held while Fluentd was unreachable
+        while unsent_logs:
+            pending_tag, pending_log = unsent_logs.popleft()
+            if not fluent_sender.emit(pending_tag, pending_log):
+                # The sender keeps the failed log and resends it once it reconnects
+                fluent_connection.mark_failed(fluent_sender.last_error)
+                return
+
+@instrumented('print_log')
 def print_log(log_data):
     # Add emoji based on message type or log level
     emoji = ""
@@ -79,13 +104,13 @@ def print_log(log_data):
     
         if message_type == "LOG":
             if log_level in ["INFO", "WARN", "ERROR"]:
-                fluent_sender.emit('service_logs', log_data)
+                emit_log('service_logs', log_data)
             elif log_level in ["FATAL", "ALERT"]:
-                fluent_sender.emit('alert_logs', log_data)
+                emit_log('alert_logs', log_data)
             else:
                 print(f"WARNING: Unhandled log level: {log_level}")
         elif message_type in ["HEARTBEAT", "REGISTRATION"]:
-            fluent_sender.emit('health_logs', log_data)
+            emit_log('health_logs', log_data)
         else:
             print(f"WARNING: Unhandled message type: {message_type}")
     except Exception as e:
@@ -106,7 +131,7 @@ def send_heartbeat(node_id, service_name, status="UP"):
 
 def generate_log(node_id, service_name, log_level, message, additional_info=None):
     log = {
-        "log_id": generate_log_id(service_name),
+        "log_id": generate_log_id(),
         "node_id": node_id,
         "log_level": log_level,
         "message_type": "LOG",
@@ -262,6 +287,7 @@ def run_service():
     
     # Set up signal handler
     signal.signal(signal.SIGINT, signal_handler)
+    install_signal_handlers(service_name)
     
     # Register service
     register_service(node_id, service_name, "UP")
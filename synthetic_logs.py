@@ -0,0 +1,486 @@
+import argparse
+import json
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+import msgpack
+import numpy as np
+
+from log_ids import EPOCH_MS, NODE_SHIFT, TIMESTAMP_SHIFT, NODE_BITS, THREAD_BITS, SEQUENCE_BITS
+
+SYNTHETIC_CHUNK_SIZE = 1 << 18     # records drawn and written per chunk
+SYNTHETIC_RATE = 20000             # simulated records per second across the fleet
+SYNTHETIC_NODES = 16               # simulated nodes per service
+HEARTBEAT_SHARE = 0.23             # a heartbeat every 5 s per node against a log every ~1.5 s
+HEARTBEAT_DOWN_SHARE = 0.01
+FATAL_SHARE = 0.003                # share of LOG records that are FATAL
+
+HEX_DIGITS = np.frombuffer(b'0123456789abcdef', dtype=np.uint8)
+# ASCII of 0000..9999, so numbers are written four digits per lookup instead of one division per digit
+DIGIT_GROUPS = np.frombuffer(''.join(f"{i:04d}" for i in range(10000)).encode('ascii'), dtype=np.uint32)
+DIGIT_PAIRS = np.frombuffer(''.join(f"{i:02d}" for i in range(100)).encode('ascii'), dtype=np.uint16)
+US_PER_DAY = 86400 * 1000000
+
+
+def choice(*values):
+    return ('choice', values)
+
+
+def randint(low, high):
+    return ('int', low, high)
+
+
+HEX8 = ('hex8',)   # str(uuid.uuid4())[:8]
+
+# Message catalogs of payment.py, stock.py and user.py. A message is a list of literal text and
+# parameters; WARN entries add response_time_ms / threshold_limit_ms and ERROR/FATAL entries
+# add error_details, as the services do.
+SERVICE_CATALOGS = [
+    {
+        'service_name': 'PaymentGatewayService',
+        'node_prefix': 'PaymentService',
+        'levels': {'INFO': 0.85, 'WARN': 0.1, 'ERROR': 0.05},
+        'INFO': [
+            {'message': ["Payment processed successfully - Amount: ₹", randint(100, 10000), " via ",
+                         choice("CREDIT_CARD", "DEBIT_CARD", "UPI", "NET_BANKING", "WALLET")]},
+            {'message': ["New payment provider ", choice("VISA", "MASTERCARD", "AMEX", "RUPAY", "PAYTM"),
+                         " integration health check completed"]},
+            {'message': ["User ", HEX8, " wallet recharged with ₹", randint(100, 10000)]},
+            {'message': ["Daily transaction count: ", randint(1000, 5000), " payments processed"]},
+            {'message': ["Payment reconciliation completed for ",
+                         choice("VISA", "MASTERCARD", "AMEX", "RUPAY", "PAYTM")]},
+        ],
+        'WARN': [
+            {'message': ["High latency detected in ", choice("CREDIT_CARD", "DEBIT_CARD", "UPI", "NET_BANKING"),
+                         " gateway"], 'response_time_ms': (3000, 5000), 'threshold_limit_ms': 3000},
+            {'message': ["Payment gateway approaching rate limit threshold"],
+             'response_time_ms': (3000, 5000), 'threshold_limit_ms': 3000},
+        ],
+        'ERROR': [
+            {'message': ["Payment authorization failed for transaction #", HEX8],
+             'error_details': {"error_code": "PAY_001", "error_message": "Card declined by issuing bank"}},
+            {'message': ["Payment gateway connection timeout with ",
+                         choice("VISA", "MASTERCARD", "AMEX", "RUPAY", "PAYTM")],
+             'error_details': {"error_code": "PAY_002", "error_message": "Gateway connection timeout after 30 seconds"}},
+            {'message': ["Invalid payment token detected"],
+             'error_details': {"error_code": "PAY_003",
+                               "error_message": "Payment token validation failed - possible security breach"}},
+        ],
+        'FATAL': [
+            {'message': ["Critical failure in payment processing system"],
+             'error_details': {"error_code": "FATAL_001", "error_message": "Payment gateway core services non-responsive"}},
+            {'message': ["Payment security system breach detected"],
+             'error_details': {"error_code": "FATAL_002",
+                               "error_message": "Multiple suspicious transactions detected - initiating emergency shutdown"}},
+        ],
+    },
+    {
+        'service_name': 'StockTradingService',
+        'node_prefix': 'StockService',
+        'levels': {'INFO': 0.6, 'WARN': 0.25, 'ERROR': 0.15},
+        'INFO': [
+            {'message': ["Successfully processed buy order for ",
+                         choice("ADANIENT", "ADANIPORTS", "ASIANPAINT", "AXISBANK", "BAJAJ-AUTO",
+                                "BAJFINANCE", "BAJAJFINSV", "BHARTIARTL", "BPCL", "BRITANNIA"), " stock"]},
+            {'message': ["Market data update received for ", randint(1, 5), " stocks"]},
+            {'message': ["User ", HEX8, " accessed portfolio dashboard"]},
+            {'message': ["Daily trading volume: ", randint(10000, 50000), " transactions"]},
+            {'message': ["New stock ", choice("GAIL", "TATAPOWER", "DMART"), " added to watchlist"]},
+        ],
+        'WARN': [
+            {'message': ["API response time exceeding threshold for ",
+                         choice("ADANIENT", "ADANIPORTS", "ASIANPAINT", "AXISBANK", "BAJAJ-AUTO")],
+             'response_time_ms': (100, 500), 'threshold_limit_ms': 100},
+        ],
+        'ERROR': [
+            {'message': ["Failed to execute trade order #", HEX8],
+             'error_details': {"error_code": "TRADE_001", "error_message": "Insufficient funds in account"}},
+            {'message': ["Database connection timeout for stock ",
+                         choice("ADANIENT", "ADANIPORTS", "ASIANPAINT", "AXISBANK", "BAJAJ-AUTO")],
+             'error_details': {"error_code": "DB_001", "error_message": "Connection timed out after 30 seconds"}},
+        ],
+        'FATAL': [
+            {'message': ["Critical system failure detected in trading engine"],
+             'error_details': {"error_code": "FATAL_001", "error_message": "Trading engine core components non-responsive"}},
+            {'message': ["Catastrophic database corruption detected"],
+             'error_details': {"error_code": "FATAL_002",
+                               "error_message": "Database integrity check failed - immediate attention required"}},
+        ],
+    },
+    {
+        'service_name': 'ProfileManagementService',
+        'node_prefix': 'ProfileService',
+        'levels': {'INFO': 0.7, 'WARN': 0.2, 'ERROR': 0.1},
+        'INFO': [
+            {'message': ["User ", HEX8, " updated profile fields: address, phone, email"]},
+            {'message': ["Password successfully changed for user ", HEX8]},
+            {'message': ["User ", HEX8, " updated preferences: notifications, language, timezone"]},
+            {'message': ["Profile accessed by user ", HEX8]},
+            {'message': ["Two-factor authentication configured for user ", HEX8]},
+        ],
+        'WARN': [
+            {'message': ["High latency detected in profile data retrieval"],
+             'response_time_ms': (300, 800), 'threshold_limit_ms': 300},
+            {'message': ["Multiple failed login attempts detected"],
+             'response_time_ms': (150, 200), 'threshold_limit_ms': 150},
+            {'message': ["Profile image upload size exceeding recommended limit"],
+             'response_time_ms': (400, 900), 'threshold_limit_ms': 400},
+        ],
+        'ERROR': [
+            {'message': ["Failed to update user profile"],
+             'error_details': {"error_code": "PROF_001", "error_message": "Database constraint violation - duplicate email"}},
+            {'message': ["Profile picture upload failed"],
+             'error_details': {"error_code": "PROF_002", "error_message": "Invalid file format - only JPG/PNG allowed"}},
+            {'message': ["2FA verification failed"],
+             'error_details': {"error_code": "AUTH_001", "error_message": "Invalid authentication code provided"}},
+        ],
+        'FATAL': [
+            {'message': ["Critical failure in user authentication system"],
+             'error_details': {"error_code": "FATAL_001", "error_message": "Authentication service connection lost"}},
+            {'message': ["Profile database corruption detected"],
+             'error_details': {"error_code": "FATAL_002",
+                               "error_message": "Database integrity check failed - immediate attention required"}},
+        ],
+    },
+]
+
+
+def digit_buckets(low, high):
+    """Split an inclusive integer range by digit count, with each bucket's share of the range"""
+    buckets = []
+    digits = len(str(low))
+    while 10 ** (digits - 1) <= high:
+        bucket_low, bucket_high = max(low, 10 ** (digits - 1)), min(high, 10 ** digits - 1)
+        if bucket_low <= bucket_high:
+            buckets.append((bucket_low, bucket_high, digits, (bucket_high - bucket_low + 1) / (high - low + 1)))
+        digits += 1
+    return buckets
+
+
+def expand_pieces(pieces):
+    """Every fixed-width form of a message: choices become literals, integers are split by digit count"""
+    forms = [(1.0, [])]
+    for piece in pieces:
+        if isinstance(piece, str):
+            options = [(1.0, piece)]
+        elif piece[0] == 'choice':
+            options = [(1.0 / len(piece[1]), value) for value in piece[1]]
+        elif piece[0] == 'int':
+            options = [(share, ('digits', low, high, digits)) for low, high, digits, share in digit_buckets(*piece[1:])]
+        else:
+            options = [(1.0, ('hex8',))]
+        forms = [(p * q, form + [option]) for p, form in forms for q, option in options]
+    return forms
+
+
+class Shape:
+    """One fixed-width record layout and its probability.
+
+    `fields` is the record in key order; values are constants, ('str', pieces),
+    ('u16', low, high, digits) or one of ('log_id',), ('node',), ('timestamp',).
+    """
+
+    def __init__(self, probability, service_index, fields):
+        self.probability = probability
+        self.service_index = service_index
+        self.fields = fields
+        self.layout = None
+        self.width = 0
+
+
+def build_shapes():
+    shapes = []
+    service_share = 1.0 / len(SERVICE_CATALOGS)
+    for service_index, catalog in enumerate(SERVICE_CATALOGS):
+        heartbeat = service_share * HEARTBEAT_SHARE
+        for status, share in (('UP', 1 - HEARTBEAT_DOWN_SHARE), ('DOWN', HEARTBEAT_DOWN_SHARE)):
+            shapes.append(Shape(heartbeat * share, service_index, [
+                ('node_id', ('node',)), ('message_type', 'HEARTBEAT'),
+                ('status', status), ('timestamp', ('timestamp',)),
+            ]))
+        log_share = service_share * (1 - HEARTBEAT_SHARE)
+        levels = {level: weight * (1 - FATAL_SHARE) for level, weight in catalog['levels'].items()}
+        levels['FATAL'] = FATAL_SHARE
+        for level, level_share in levels.items():
+            variants = catalog[level]
+            for variant in variants:
+                variant_share = log_share * level_share / len(variants)
+                response_times = [(1.0, None)]
+                if 'response_time_ms' in variant:
+                    response_times = [(share, ('u16', low, high, digits))
+                                      for low, high, digits, share in digit_buckets(*variant['response_time_ms'])]
+                for message_share, pieces in expand_pieces(variant['message']):
+                    for response_share, response_time in response_times:
+                        fields = [
+                            ('log_id', ('log_id',)), ('node_id', ('node',)), ('log_level', level),
+                            ('message_type', 'LOG'), ('message', ('str', pieces)),
+                            ('service_name', catalog['service_name']), ('timestamp', ('timestamp',)),
+                        ]
+                        if response_time:
+                            fields += [('response_time_ms', response_time),
+                                       ('threshold_limit_ms', variant['threshold_limit_ms'])]
+                        if 'error_details' in variant:
+                            fields.append(('error_details', variant['error_details']))
+                        shapes.append(Shape(variant_share * message_share * response_share, service_index, fields))
+    return shapes
+
+
+def _str_header(length):
+    return msgpack.packb('x' * length)[:-length] if length else b'\xa0'
+
+
+def compile_layout(shape, node_width, fmt):
+    """Flatten a shape into constant bytes and fixed-width slots: [(bytes or (kind, width, spec))]"""
+    layout = []
+
+    def literal(data):
+        if layout and isinstance(layout[-1], bytes):
+            layout[-1] += data
+        else:
+            layout.append(data)
+
+    def pieces_width(pieces):
+        width = 0
+        for piece in pieces:
+            if isinstance(piece, str):
+                width += len(piece.encode('utf-8'))
+            else:
+                width += 8 if piece[0] == 'hex8' else piece[3]
+        return width
+
+    def emit_pieces(pieces):
+        for piece in pieces:
+            if isinstance(piece, str):
+                literal((json.dumps(piece, ensure_ascii=False)[1:-1] if fmt == 'ndjson' else piece).encode('utf-8'))
+            elif piece[0] == 'hex8':
+                layout.append(('hex8', 8, piece))
+            else:
+                layout.append(('digits', piece[3], piece))
+
+    if fmt == 'ndjson':
+        literal(b'{')
+        for position, (key, value) in enumerate(shape.fields):
+            literal((b', ' if position else b'') + json.dumps(key).encode('utf-8') + b': ')
+            kind = value[0] if isinstance(value, tuple) else None
+            if kind == 'str':
+                literal(b'"')
+                emit_pieces(value[1])
+                literal(b'"')
+            elif kind == 'u16':
+                layout.append(('digits', value[3], value))
+            elif kind == 'log_id':
+                literal(b'"')
+                layout.append(('log_id', 19, value))
+                literal(b'"')
+            elif kind == 'node':
+                literal(b'"')
+                layout.append(('node', node_width, value))
+                literal(b'"')
+            elif kind == 'timestamp':
+                literal(b'"')
+                layout.append(('timestamp', 26, value))
+                literal(b'+00:00"')
+            else:
+                literal(json.dumps(value, ensure_ascii=False).encode('utf-8'))
+        literal(b'}\n')
+    else:
+        literal(msgpack.packb({key: None for key, _ in shape.fields})[:1])
+        for key, value in shape.fields:
+            literal(msgpack.packb(key))
+            kind = value[0] if isinstance(value, tuple) else None
+            if kind == 'str':
+                literal(_str_header(pieces_width(value[1])))
+                emit_pieces(value[1])
+            elif kind == 'u16':
+                literal(b'\xcd')
+                layout.append(('u16', 2, value))
+            elif kind == 'log_id':
+                literal(_str_header(19))
+                layout.append(('log_id', 19, value))
+            elif kind == 'node':
+                literal(_str_header(node_width))
+                layout.append(('node', node_width, value))
+            elif kind == 'timestamp':
+                literal(_str_header(32))
+                layout.append(('timestamp', 26, value))
+                literal(b'+00:00')
+            else:
+                literal(msgpack.packb(value))
+    return layout
+
+
+def _rows(matrix):
+    """View an (n, width) uint8 matrix as n opaque items, so taking rows is one copy per row"""
+    return matrix.view(np.dtype((np.void, matrix.shape[1]))).ravel()
+
+
+def _digits(values, width):
+    """ASCII digits of non-negative integers, zero-padded to `width`, as an (n, width) uint8 array"""
+    groups = -(-width // 4)
+    out = np.empty((len(values), groups), dtype=np.uint32)
+    for group in range(groups - 1, -1, -1):
+        values, low = np.divmod(values, 10000)
+        out[:, group] = DIGIT_GROUPS[low]
+    return out.view(np.uint8)[:, groups * 4 - width:]
+
+
+def _iso_timestamps(timestamps):
+    """'YYYY-MM-DDTHH:MM:SS.ffffff' for microsecond epoch timestamps, as an (n, 26) uint8 array"""
+    days, day_us = np.divmod(timestamps, US_PER_DAY)
+    first_day = int(days.min())
+    calendar = np.arange(first_day, int(days.max()) + 1).astype('datetime64[D]')
+    dates = np.datetime_as_string(calendar).astype('S10').view(np.uint8).reshape(-1, 10)
+    seconds, fraction = np.divmod(day_us, 1000000)
+    minutes, second = np.divmod(seconds, 60)
+    hour, minute = np.divmod(minutes, 60)
+    out = np.empty((len(timestamps), 26), dtype=np.uint8)
+    out[:, 0:10] = _rows(dates)[days - first_day].view(np.uint8).reshape(-1, 10)
+    out[:, 10:19] = np.frombuffer(b'T00:00:00', dtype=np.uint8)
+    out[:, 11:13] = DIGIT_PAIRS[hour].view(np.uint8).reshape(-1, 2)
+    out[:, 14:16] = DIGIT_PAIRS[minute].view(np.uint8).reshape(-1, 2)
+    out[:, 17:19] = DIGIT_PAIRS[second].view(np.uint8).reshape(-1, 2)
+    out[:, 19] = ord('.')
+    out[:, 20:26] = _digits(fraction, 6)
+    return out
+
+
+class SyntheticLogGenerator:
+    """Draws records for every shape in bulk and writes each shape's rows as one byte matrix.
+
+    Per chunk, every record gets a shape (service, level, message form),
+    timestamp, node and id in a few vectorized draws; the rows of each shape
+    share one fixed width, so they are filled column block by column block
+    with no per-record Python. Chunks follow each other in time; within a
+    chunk records are grouped by shape. Log ids use the log_ids.py layout and
+    are unique while the rate stays below 4 million records per second.
+    """
+
+    def __init__(self, seed=0, rate=SYNTHETIC_RATE, nodes=SYNTHETIC_NODES, start=None, fmt='ndjson'):
+        self.rng = np.random.default_rng(seed)
+        self.rate = rate
+        self.fmt = fmt
+        start = start or datetime(2026, 1, 1, tzinfo=timezone.utc)
+        self.start_us = int(start.timestamp() * 1000000)
+        self.generated = 0
+        self.shapes = build_shapes()
+        self.shape_services = np.array([shape.service_index for shape in self.shapes], dtype=np.int64)
+        probabilities = np.array([shape.probability for shape in self.shapes])
+        self.probabilities = probabilities / probabilities.sum()
+
+        # Node names of one service share a width, so a node is a row of a small byte matrix
+        self.node_matrices = []
+        for catalog in SERVICE_CATALOGS:
+            names = b''.join(f"{catalog['node_prefix']}_node-{i:04d}".encode('utf-8') for i in range(nodes))
+            self.node_matrices.append(np.frombuffer(names, dtype=np.uint8).reshape(nodes, -1))
+        self.nodes = nodes
+        for shape in self.shapes:
+            shape.layout = compile_layout(shape, self.node_matrices[shape.service_index].shape[1], fmt)
+            shape.width = sum(len(part) if isinstance(part, bytes) else part[1] for part in shape.layout)
+
+    def chunks(self, count, chunk_size=SYNTHETIC_CHUNK_SIZE):
+        """Yield (record count, [byte matrix per shape]) until `count` records are produced"""
+        while count > 0:
+            size = min(chunk_size, count)
+            yield size, self._chunk(size)
+            count -= size
+
+    def _chunk(self, size):
+        rng = self.rng
+        sequence = self.generated + np.arange(size, dtype=np.int64)
+        self.generated += size
+        timestamps = self.start_us + (sequence * 1000000) // self.rate
+        shape_ids = rng.choice(len(self.shapes), size=size, p=self.probabilities)
+        node_ids = rng.integers(0, self.nodes, size=size)
+        # Timestamp and id text for the whole chunk at once; shapes then take their rows
+        timestamp_text = _rows(_iso_timestamps(timestamps))
+        node = (self.shape_services[shape_ids] * self.nodes + node_ids) & ((1 << NODE_BITS) - 1)
+        slot = sequence & ((1 << (THREAD_BITS + SEQUENCE_BITS)) - 1)
+        log_id_text = _rows(np.ascontiguousarray(
+            _digits(((timestamps // 1000 - EPOCH_MS) << TIMESTAMP_SHIFT) | (node << NODE_SHIFT) | slot, 19)))
+
+        # A stable sort of small integers is a radix sort
+        order = np.argsort(shape_ids.astype(np.uint16), kind='stable')
+        bounds = np.searchsorted(shape_ids[order], np.arange(len(self.shapes) + 1))
+        blocks = []
+        for shape_id, shape in enumerate(self.shapes):
+            rows = order[bounds[shape_id]:bounds[shape_id + 1]]
+            if len(rows):
+                blocks.append(self._fill(shape, timestamp_text[rows], log_id_text[rows], node_ids[rows]))
+        return blocks
+
+    def _fill(self, shape, timestamp_text, log_id_text, node_ids):
+        n = len(node_ids)
+        out = np.empty((n, shape.width), dtype=np.uint8)
+        offset = 0
+        for part in shape.layout:
+            if isinstance(part, bytes):
+                out[:, offset:offset + len(part)] = np.frombuffer(part, dtype=np.uint8)
+                offset += len(part)
+                continue
+            kind, width, spec = part
+            if kind == 'timestamp':
+                out[:, offset:offset + width] = timestamp_text.view(np.uint8).reshape(n, width)
+            elif kind == 'node':
+                nodes = _rows(self.node_matrices[shape.service_index])[node_ids]
+                out[:, offset:offset + width] = nodes.view(np.uint8).reshape(n, width)
+            elif kind == 'log_id':
+                out[:, offset:offset + width] = log_id_text.view(np.uint8).reshape(n, width)
+            elif kind == 'hex8':
+                values = self.rng.integers(0, 1 << 32, size=n, dtype=np.uint64)
+                shifts = np.arange(28, -1, -4, dtype=np.uint64)
+                out[:, offset:offset + width] = HEX_DIGITS[(values[:, None] >> shifts) & np.uint64(15)]
+            elif kind == 'digits':
+                _, low, high, digits = spec
+                out[:, offset:offset + width] = _digits(self.rng.integers(low, high + 1, size=n), width)
+            else:  # u16, big-endian
+                _, low, high, _ = spec
+                out[:, offset:offset + width] = self.rng.integers(low, high + 1, size=n).astype('>u2').view(np.uint8).reshape(n, 2)
+            offset += width
+        return out
+
+
+def write_synthetic_logs(path, count, fmt='ndjson', seed=0, rate=SYNTHETIC_RATE, nodes=SYNTHETIC_NODES, start=None):
+    """Write `count` synthetic records to `path` as NDJSON or a msgpack stream; returns records per second"""
+    generator = SyntheticLogGenerator(seed=seed, rate=rate, nodes=nodes, start=start, fmt=fmt)
+    # Writing happens on its own thread (file writes release the GIL) so the disk and the draws overlap
+    pending = queue.Queue(maxsize=4)
+
+    def write(f):
+        while True:
+            blocks = pending.get()
+            if blocks is None:
+                return
+            for block in blocks:
+                f.write(block)
+
+    started = time.perf_counter()
+    with open(path, 'wb') as f:
+        writer = threading.Thread(target=write, args=(f,), name='synthetic-writer')
+        writer.start()
+        try:
+            for _, blocks in generator.chunks(count):
+                pending.put(blocks)
+        finally:
+            pending.put(None)
+            writer.join()
+    return count / (time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write synthetic service logs for replay and benchmarks")
+    parser.add_argument('path')
+    parser.add_argument('-n', '--count', type=int, default=1000000)
+    parser.add_argument('--format', choices=['ndjson', 'msgpack'], default='ndjson')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--rate', type=int, default=SYNTHETIC_RATE, help="simulated records per second")
+    parser.add_argument('--nodes', type=int, default=SYNTHETIC_NODES, help="simulated nodes per service")
+    parser.add_argument('--start', type=datetime.fromisoformat, help="first timestamp (ISO, UTC if no offset)")
+    args = parser.parse_args()
+
+    start = args.start
+    if start is not None and start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    rate = write_synthetic_logs(args.path, args.count, args.format, args.seed, args.rate, args.nodes, start)
+    print(f"Wrote {args.count} records to {args.path} at {rate:,.0f} records/s")
@@ -0,0 +1,157 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+TAIL_BUFFER_SIZE = 10000       # records kept in the shared ring buffer
+TAIL_KEEPALIVE_SECONDS = 15
+TAIL_MAX_BATCH = 500           # records copied out of the ring per wakeup
+
+
+class LogRing:
+    """Fixed-size ring of recent logs shared by every subscriber.
+
+    Publishing only stores the record and wakes waiting readers, so ingestion
+    never waits on a viewer. Each reader keeps its own cursor; a reader that
+    falls more than a full ring behind has lost those records and is told how
+    many it missed.
+    """
+
+    def __init__(self, size=TAIL_BUFFER_SIZE):
+        self.size = size
+        self.items = [None] * size
+        self.next_seq = 0
+        self.condition = threading.Condition()
+
+    def publish(self, log_data):
+        with self.condition:
+            self.items[self.next_seq % self.size] = log_data
+            self.next_seq += 1
+            self.condition.notify_all()
+
+    def read(self, cursor, timeout):
+        """Wait for records after `cursor`, returning (records, new_cursor, missed)"""
+        with self.condition:
+            if cursor >= self.next_seq:
+                self.condition.wait(timeout)
+            missed = 0
+            oldest = self.next_seq - self.size
+            if cursor < oldest:
+                missed = oldest - cursor
+                cursor = oldest
+            end = min(self.next_seq, cursor + TAIL_MAX_BATCH)
+            records = [self.items[seq % self.size] for seq in range(cursor, end)]
+        return records, end, missed
+
+
+def build_filter(query):
+    """Predicate from ?level=&service=&node=&q= query parameters"""
+    params = parse_qs(query)
+    levels = {v for value in params.get('level', []) for v in value.upper().split(',') if v}
+    services = {v for value in params.get('service', []) for v in value.split(',') if v}
+    nodes = {v for value in params.get('node', []) for v in value.split(',') if v}
+    text = params.get('q', [''])[0].lower()
+
+    def matches(log_data):
+        if levels and log_data.get('log_level', log_data.get('message_type')) not in levels:
+            return False
+        if services and log_data.get('service_name') not in services:
+            return False
+        if nodes and log_data.get('node_id') not in nodes:
+            return False
+        if text and text not in str(log_data.get('message', '')).lower():
+            return False
+        return True
+    return matches
+
+
+class TailHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/ready':
+            self.send_readiness()
+            return
+        if url.path != '/tail':
+            self.send_error(404, "Use /tail?level=&service=&node=&q= or /ready")
+            return
+        params = parse_qs(url.query)
+        matches = build_filter(url.query)
+        drop_when_slow = params.get('slow', ['skip'])[0] == 'drop'
+        try:
+            backlog = int(params.get('backlog', ['0'])[0])
+        except ValueError:
+            backlog = -1
+        if backlog < 0:
+            self.send_error(400, "backlog must be a non-negative integer")
+            return
+        ring = self.server.ring
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'keep-alive')
+        self.end_headers()
+
+        cursor = max(0, ring.next_seq - min(backlog, ring.size))
+        try:
+            while self.server.is_running:
+                records, cursor, missed = ring.read(cursor, TAIL_KEEPALIVE_SECONDS)
+                chunks = []
+                if missed:
+                    if drop_when_slow:
+                        self.wfile.write(f"event: dropped\ndata: {missed}\n\n".encode('utf-8'))
+                        return
+                    chunks.append(f": skipped {missed} logs\n\n")
+                for log_data in records:
+                    if matches(log_data):
+                        chunks.append(f"data: {json.dumps(log_data)}\n\n")
+                if not chunks:
+                    chunks.append(": keepalive\n\n")
+                self.wfile.write(''.join(chunks).encode('utf-8'))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            self.close_connection = True
+
+    def send_readiness(self):
+        status = self.server.readiness() if self.server.readiness else {}
+        ready = all(connection.get('ready') for connection in status.values())
+        body = json.dumps({'ready': ready, 'connections': status}).encode('utf-8')
+        self.send_response(200 if ready else 503)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class TailServer(ThreadingHTTPServer):
+    """Server-sent events endpoint streaming consumed logs to any number of viewers"""
+
+    daemon_threads = True
+
+    def __init__(self, host, port, buffer_size=TAIL_BUFFER_SIZE, readiness=None):
+        super().__init__((host, port), TailHandler)
+        self.ring = LogRing(buffer_size)
+        self.readiness = readiness
+        self.is_running = False
+
+    def publish(self, log_data):
+        self.ring.publish(log_data)
+
+    def start(self):
+        self.is_running = True
+        server_thread = threading.Thread(target=self.serve_forever)
+        server_thread.daemon = True
+        server_thread.start()
+
+    def stop(self):
+        self.is_running = False
+        with self.ring.condition:
+            self.ring.condition.notify_all()
+        self.shutdown()
@@ -0,0 +1,146 @@
+import hashlib
+import json
+import os
+import re
+from collections import OrderedDict
+
+WILDCARD = '<*>'
+
+TEMPLATE_TREE_DEPTH = 4           # token-count level + (depth - 2) prefix-token levels
+TEMPLATE_SIMILARITY = 0.5         # fraction of matching tokens needed to join a template
+TEMPLATE_MAX_CHILDREN = 100       # prefix tokens per tree node before falling back to the wildcard
+TEMPLATE_MAX_CLUSTERS = 1000      # templates kept in the LRU cache
+
+HEX_ID_PATTERN = re.compile(r'#?[0-9a-fA-F]{8,}[,.:]?')
+
+
+def is_variable(token):
+    """Tokens with digits or id-like hex strings are parameters, not template text"""
+    return any(c.isdigit() for c in token) or HEX_ID_PATTERN.fullmatch(token) is not None
+
+
+def template_id_for(tokens):
+    return hashlib.blake2b(' '.join(tokens).encode('utf-8'), digest_size=4).hexdigest()
+
+
+class LogCluster:
+    __slots__ = ('template_id', 'tokens', 'size')
+
+    def __init__(self, tokens):
+        self.template_id = template_id_for(tokens)
+        self.tokens = tokens
+        self.size = 1
+
+    @property
+    def template(self):
+        return ' '.join(self.tokens)
+
+
+class TemplateMiner:
+    """Streaming Drain-style template extraction with a bounded template cache.
+
+    Messages are split on whitespace, tokens that look like numbers or ids
+    are treated as variables up front, and the message is routed through a
+    fixed-depth tree (token count, then leading tokens) to a small list of
+    candidate templates.
+    A template keeps the id it was created with as it absorbs more wildcards.
+    """
+
+    def __init__(self, depth=TEMPLATE_TREE_DEPTH, similarity=TEMPLATE_SIMILARITY,
+                 max_children=TEMPLATE_MAX_CHILDREN, max_clusters=TEMPLATE_MAX_CLUSTERS):
+        self.prefix_depth = max(depth - 2, 1)
+        self.similarity = similarity
+        self.max_children = max_children
+        self.max_clusters = max_clusters
+        self.root = {}
+        self.clusters = OrderedDict()
+
+    def _leaf(self, tokens):
+        node = self.root.setdefault(len(tokens), {})
+        for token in tokens[:self.prefix_depth]:
+            key = token
+            if key not in node:
+                if len(node) >= self.max_children:
+                    key = WILDCARD
+                node = node.setdefault(key, {})
+            else:
+                node = node[key]
+        return node.setdefault('', [])
+
+    def _best_match(self, leaf, tokens):
+        best, best_score = None, (-1.0, -1)
+        alive = []
+        for template_id in leaf:
+            cluster = self.clusters.get(template_id)
+            if cluster is None:
+                continue
+            alive.append(template_id)
+            same = wildcards = 0
+            for template_token, token in zip(cluster.tokens, tokens):
+                if template_token == WILDCARD:
+                    wildcards += 1
+                elif template_token == token:
+                    same += 1
+            score = (same / len(tokens), wildcards)
+            if score > best_score:
+                best, best_score = cluster, score
+        # Drop ids the LRU has already evicted
+        leaf[:] = alive
+        if best is not None and best_score[0] >= self.similarity:
+            return best
+        return None
+
+    def add(self, message):
+        """Assign a message to a template, returning (template_id, template, params)"""
+        raw_tokens = message.split()
+        if not raw_tokens:
+            return None, '', []
+        tokens = [WILDCARD if is_variable(t) else t for t in raw_tokens]
+
+        leaf = self._leaf(tokens)
+        cluster = self._best_match(leaf, tokens)
+        if cluster is None:
+            cluster = LogCluster(tokens)
+            if cluster.template_id in self.clusters:
+                cluster = self.clusters[cluster.template_id]
+            else:
+                self.clusters[cluster.template_id] = cluster
+                leaf.append(cluster.template_id)
+                if len(self.clusters) > self.max_clusters:
+                    self.clusters.popitem(last=False)
+        else:
+            cluster.tokens = [
+                t if t == token else WILDCARD for t, token in zip(cluster.tokens, tokens)
+            ]
+            cluster.size += 1
+        self.clusters.move_to_end(cluster.template_id)
+
+        params = [raw for raw, t in zip(raw_tokens, cluster.tokens) if t == WILDCARD]
+        return cluster.template_id, cluster.template, params
+
+    def templates(self):
+        """Current templates, most frequent first"""
+        return sorted(
+            ((c.template_id, c.template, c.size) for c in self.clusters.values()),
+            key=lambda item: item[2],
+            reverse=True,
+        )
+
+    def save(self, path):
+        """Persist templates so ids stay stable across consumer restarts"""
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump([[c.template_id, c.tokens, c.size] for c in self.clusters.values()], f)
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        if not os.path.exists(path):
+            return
+        with open(path) as f:
+            saved = json.load(f)
+        for template_id, tokens, size in saved[-self.max_clusters:]:
+            cluster = LogCluster(tokens)
+            cluster.template_id = template_id
+            cluster.size = size
+            self.clusters[template_id] = cluster
+            self._leaf(tokens).append(template_id)
@@ -0,0 +1,84 @@
+import asyncio
+import struct
+import time
+
+import msgpack
+from fluent import sender
+
+from fluent_gateway import FluentGateway
+
+FLUSH_SECONDS = {'service_logs': 0.01, 'alert_logs': 0.01, 'health_logs': 0.01}
+
+
+class CaptureSink:
+    def __init__(self):
+        self.records = []
+
+    def deliver(self, topic, records):
+        self.records.extend((topic, record) for record in records)
+
+    def close(self):
+        pass
+
+
+def event_time(seconds=None):
+    seconds = time.time() if seconds is None else seconds
+    return msgpack.ExtType(0, struct.pack('>II', int(seconds), int(seconds % 1 * 1e9)))
+
+
+async def _send_events(events, sink):
+    gateway = FluentGateway(sink, flush_seconds=FLUSH_SECONDS)
+    servers = await gateway.start('127.0.0.1', [0])
+    port = servers[0].sockets[0].getsockname()[1]
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    for event in events:
+        writer.write(msgpack.packb(event))
+    await writer.drain()
+    ack = msgpack.unpackb(await asyncio.wait_for(reader.read(1024), 5))
+    writer.close()
+    await gateway.close()
+    return gateway, ack
+
+
+def test_message_mode_with_event_time():
+    sink = CaptureSink()
+    events = [
+        ['services.service_logs', event_time(), {'log_id': '1'}],
+        ['services.health_logs', [[event_time(), {'log_id': '2'}], [event_time(), {'log_id': '3'}]]],
+        ['services.alert_logs', event_time(), {'log_id': '4'}, {'chunk': 'c1'}],
+    ]
+    gateway, ack = asyncio.run(_send_events(events, sink))
+    assert ack == {'ack': 'c1'}
+    assert gateway.stats['protocol_errors'] == 0
+    assert sorted(sink.records, key=lambda item: item[1]['log_id']) == [
+        ('service_logs', {'log_id': '1'}),
+        ('health_logs', {'log_id': '2'}),
+        ('health_logs', {'log_id': '3'}),
+        ('alert_logs', {'log_id': '4'}),
+    ]
+
+
+def test_fluent_logger_nanosecond_precision():
+    async def run():
+        sink = CaptureSink()
+        gateway = FluentGateway(sink, flush_seconds=FLUSH_SECONDS)
+        servers = await gateway.start('127.0.0.1', [0])
+        port = servers[0].sockets[0].getsockname()[1]
+
+        def emit():
+            fluent_sender = sender.FluentSender('services', host='127.0.0.1', port=port, nanosecond_precision=True)
+            for i in range(3):
+                assert fluent_sender.emit('service_logs', {'log_id': str(i)})
+            fluent_sender.close()
+
+        await asyncio.get_running_loop().run_in_executor(None, emit)
+        for _ in range(100):
+            if len(sink.records) == 3:
+                break
+            await asyncio.sleep(0.01)
+        await gateway.close()
+        return gateway, sink
+
+    gateway, sink = asyncio.run(run())
+    assert gateway.stats['protocol_errors'] == 0
+    assert [record['log_id'] for _, record in sink.records] == ['0', '1', '2']
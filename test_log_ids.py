@@ -0,0 +1,54 @@
+import multiprocessing
+import threading
+
+from log_ids import SnowflakeGenerator
+
+PROCESSES = 8
+THREADS = 20      # more than the 16 thread slots, so some threads share one
+IDS_PER_THREAD = 2000
+
+
+def _generate(lock_dir, results):
+    generator = SnowflakeGenerator('node-1', lock_dir=lock_dir)
+    ids = []
+    lock = threading.Lock()
+
+    def run():
+        batch = [generator.next_id() for _ in range(IDS_PER_THREAD)]
+        with lock:
+            ids.extend(batch)
+
+    threads = [threading.Thread(target=run) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results.put(ids)
+
+
+def test_ids_unique_across_processes_and_threads(tmp_path, monkeypatch):
+    monkeypatch.delenv('LOG_ID_NODE', raising=False)
+    results = multiprocessing.Queue()
+    # Every process uses the same node key, the worst case for the old pid hash
+    processes = [multiprocessing.Process(target=_generate, args=(str(tmp_path), results)) for _ in range(PROCESSES)]
+    for process in processes:
+        process.start()
+    ids = []
+    for _ in processes:
+        ids.extend(results.get(timeout=60))
+    for process in processes:
+        process.join()
+    assert len(ids) == PROCESSES * THREADS * IDS_PER_THREAD
+    assert len(set(ids)) == len(ids)
+
+
+def test_generators_in_one_process_claim_distinct_nodes(tmp_path, monkeypatch):
+    monkeypatch.delenv('LOG_ID_NODE', raising=False)
+    first = SnowflakeGenerator('node-1', lock_dir=str(tmp_path))
+    second = SnowflakeGenerator('node-1', lock_dir=str(tmp_path))
+    assert first.node != second.node
+
+
+def test_assigned_node_is_used(monkeypatch):
+    monkeypatch.setenv('LOG_ID_NODE', '17')
+    assert SnowflakeGenerator('node-1').node == 17
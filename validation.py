@@ -0,0 +1,124 @@
+import json
+import sys
+import time
+from datetime import datetime
+
+LOG_LEVELS = ('INFO', 'WARN', 'ERROR', 'FATAL', 'ALERT')
+NUMBER = (int, float)
+
+# field: (accepted types, required, allowed values or None)
+COMMON_FIELDS = {
+    'node_id': (str, True, None),
+    'timestamp': (str, False, None),
+}
+SCHEMAS = {
+    'LOG': {
+        'log_id': (str, True, None),
+        'log_level': (str, True, LOG_LEVELS),
+        'message': (str, True, None),
+        'service_name': (str, True, None),
+        'response_time_ms': (NUMBER, False, None),
+        'threshold_limit_ms': (NUMBER, False, None),
+        'error_details': (dict, False, None),
+    },
+    'HEARTBEAT': {
+        'status': (str, True, None),
+        'service_name': (str, False, None),
+    },
+    'REGISTRATION': {
+        'status': (str, True, None),
+        'service_name': (str, True, None),
+    },
+}
+
+
+class InvalidRecord(ValueError):
+    """A consumed record that cannot be processed, with the reason and a short reason code"""
+
+    def __init__(self, code, reason):
+        super().__init__(reason)
+        self.code = code
+
+
+def compile_schema(fields):
+    """Turn a field spec into a flat tuple of checks, so validation is one pass with no lookups"""
+    checks = []
+    for name, (types, required, allowed) in fields.items():
+        # Exact type sets: a set lookup is cheaper than isinstance and keeps bools out of numbers
+        exact_types = frozenset(types if isinstance(types, tuple) else (types,))
+        type_name = ' or '.join(t.__name__ for t in (types if isinstance(types, tuple) else (types,)))
+        checks.append((name, exact_types, type_name, required, frozenset(allowed) if allowed else None))
+    return tuple(checks)
+
+
+COMPILED_SCHEMAS = {
+    message_type: compile_schema({**COMMON_FIELDS, **fields})
+    for message_type, fields in SCHEMAS.items()
+}
+
+
+def decode_record(raw):
+    """Decode a Kafka message value, raising InvalidRecord instead of JSON or Unicode errors"""
+    try:
+        log_data = json.loads(raw)
+    except (UnicodeDecodeError, ValueError) as e:
+        raise InvalidRecord('undecodable', f"not valid JSON: {e}")
+    if not isinstance(log_data, dict):
+        raise InvalidRecord('not_an_object', f"expected a JSON object, got {type(log_data).__name__}")
+    return log_data
+
+
+def validate_record(log_data):
+    """Check a decoded record against the schema for its message_type"""
+    checks = COMPILED_SCHEMAS.get(log_data.get('message_type'))
+    if checks is None:
+        raise InvalidRecord('unknown_message_type', f"unknown message_type {log_data.get('message_type')!r}")
+    for name, exact_types, type_name, required, allowed in checks:
+        value = log_data.get(name)
+        if value is None:
+            if required:
+                raise InvalidRecord('missing_field', f"missing {name}")
+            continue
+        if type(value) not in exact_types:
+            raise InvalidRecord('wrong_type', f"{name} should be {type_name}")
+        if allowed is not None and value not in allowed:
+            raise InvalidRecord('bad_value', f"{name} {value!r} is not one of {', '.join(sorted(allowed))}")
+    timestamp = log_data.get('timestamp')
+    if timestamp is not None:
+        try:
+            datetime.fromisoformat(timestamp)
+        except ValueError:
+            raise InvalidRecord('bad_timestamp', f"timestamp {timestamp!r} is not ISO 8601")
+    return log_data
+
+
+def parse_record(raw):
+    return validate_record(decode_record(raw))
+
+
+def benchmark(count=200000):
+    """Records per second for decoding alone and for decoding plus validation"""
+    sample = [
+        json.dumps({
+            "log_id": str(7200000000000000000 + i), "node_id": "PaymentGatewayService_host",
+            "log_level": "WARN", "message_type": "LOG", "message": f"High latency detected in UPI gateway {i}",
+            "service_name": "PaymentGatewayService", "timestamp": "2026-01-01T10:00:00.123456+00:00",
+            "response_time_ms": 3500, "threshold_limit_ms": 3000,
+        }).encode('utf-8')
+        for i in range(1000)
+    ]
+    results = {}
+    for label, parse in (('decode', decode_record), ('decode+validate', parse_record)):
+        started = time.perf_counter()
+        for i in range(count):
+            parse(sample[i % 1000])
+        results[label] = count / (time.perf_counter() - started)
+    return results
+
+
+if __name__ == "__main__":
+    # Measure validation overhead: python validation.py [records]
+    results = benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
+    for label, rate in results.items():
+        print(f"{label:<16} {rate:>12,.0f} records/s")
+    print(f"validation cost  {1 - results['decode+validate'] / results['decode']:>12.1%} of decode throughput")